@@ -4,11 +4,32 @@ Main web application for analyzing food ingredient labels with personalized heal
 """
 
 import os
+import io
+import csv
+import json
+import time
 import uuid
-from datetime import datetime
-from flask import Flask, render_template, request, session, redirect, url_for, jsonify
+import hashlib
+from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from flask import (
+    Flask,
+    abort,
+    render_template,
+    request,
+    session,
+    redirect,
+    url_for,
+    jsonify,
+    make_response,
+)
 from dotenv import load_dotenv
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 from utils.logging_utils import setup_logger, create_trace_id
@@ -23,50 +44,120 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key-change-in-production")
 
+# Largest accepted upload; Werkzeug rejects bigger request bodies before reading them
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
+
 logger = setup_logger(level=os.getenv("LOG_LEVEL", "INFO"))
-db.initialize_db()
-orchestrator = LabelDetectiveOrchestrator()
+orchestrator = None
+
+
+def init_services():
+    """
+    Initialize Firestore and the orchestrator once per process.
+
+    Under gunicorn with preload_app (see gunicorn.conf.py) this runs in the
+    master and forked workers inherit the result; the guard keeps a second
+    import from repeating the work. Firestore is the exception: gRPC is not
+    fork-safe, so the preloading master skips it and each worker initializes
+    (and warms up) its own clients in post_fork.
+    """
+    global orchestrator
+    if getattr(app, "_initialized", False):
+        return
+
+    if os.getenv("LD_DEFER_DB_INIT") != "1":
+        db.initialize_db()
+    orchestrator = LabelDetectiveOrchestrator()
+    app._initialized = True
+
+
+init_services()
+
 
 # Metrics
 scan_requests_total = Counter("scan_requests_total", "Total scan requests")
 scan_errors_total = Counter("scan_errors_total", "Total scan errors")
-scan_latency = Histogram("scan_latency_ms", "Scan latency in milliseconds")
+# Histogram.time() observes seconds; buckets cover OCR + LLM scan latencies
+scan_latency = Histogram(
+    "scan_latency_seconds",
+    "Scan latency in seconds",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60),
+)
 human_review_count = Counter("human_review_count", "Number of human reviews created")
 judge_disagreement_count = Counter(
     "judge_disagreement_count", "Number of judge disagreements"
 )
 
-# Default user profile
-DEFAULT_PROFILE = {
-    "display_name": "Guest User",
-    "allergies": [],
-    "diet_tags": [],
-    "sustainability_goals": [],
-    "ingredient_blocklist": [],
-    "explain_level": "detailed",
-    "data_consent": False,
-    "created_at": datetime.utcnow().isoformat(),
-}
+# Scrapes within this window reuse the last /metrics snapshot and its ETag
+METRICS_CACHE_SECONDS = 1.0
+_metrics_snapshot = {"expires": 0.0, "body": b"", "etag": ""}
+_metrics_lock = Lock()
+
+# Largest JSON body accepted by the /api endpoints
+MAX_JSON_BYTES = 64 * 1024
+
+
+@dataclass
+class UserProfile:
+    """Guest profile defaults; profiles travel as dicts via default_profile()."""
+
+    display_name: str = "Guest User"
+    allergies: List[Dict[str, Any]] = field(default_factory=list)
+    diet_tags: List[str] = field(default_factory=list)
+    sustainability_goals: List[str] = field(default_factory=list)
+    ingredient_blocklist: List[str] = field(default_factory=list)
+    explain_level: str = "detailed"
+    data_consent: bool = False
+    created_at: str = field(
+        default_factory=lambda: datetime.now(timezone.utc).isoformat()
+    )
+
+
+# Built once; default_profile() copies it instead of re-running asdict()
+_DEFAULT_PROFILE = asdict(UserProfile())
+
+
+def default_profile(user_id: Optional[str] = None) -> dict:
+    """Fresh guest profile dict; user_id is only set for real users."""
+    profile = {
+        key: list(value) if isinstance(value, list) else value
+        for key, value in _DEFAULT_PROFILE.items()
+    }
+    profile["created_at"] = datetime.now(timezone.utc).isoformat()
+    if user_id:
+        profile["user_id"] = user_id
+    return profile
 
 
 def get_or_create_user_id():
     """Get user_id from session or create new."""
     if "user_id" not in session:
-        session["user_id"] = str(uuid.uuid4())
+        session["user_id"] = uuid.uuid4().hex
     return session["user_id"]
 
 
-def get_user_profile(user_id: str):
-    """Load user profile or return default."""
-    profile = db.get_user(user_id)
-    if not profile:
-        profile = DEFAULT_PROFILE.copy()
-        profile["user_id"] = user_id
+def get_user_profile(user_id: str, fresh: bool = False):
+    """
+    Load user profile or return default.
+
+    db.get_user caches repeat reads per worker; pass fresh=True where a stale
+    profile (e.g. an allergy added via another worker) must not be used.
+    """
+    stored = db.get_user(user_id, fresh=fresh)
+    if not stored:
+        profile = default_profile(user_id)
 
         # Save default profile if consent given
         if profile.get("data_consent"):
             db.save_user(user_id, profile)
 
+        return profile
+
+    # A blocklist-only write (add_to_blocklist) leaves a partial document;
+    # lay it over the defaults so every profile field is present
+    profile = default_profile(user_id)
+    profile.update(stored)
     return profile
 
 
@@ -102,12 +193,16 @@ def scan():
             if file.filename == "":
                 return render_template("error.html", error="No image selected"), 400
 
-            raw_input = file.read()
+            # Bounded read: never buffer more than the cap plus one byte
+            raw_input = file.read(MAX_UPLOAD_BYTES + 1)
+            if len(raw_input) > MAX_UPLOAD_BYTES:
+                return render_template("error.html", error="Image too large"), 413
         else:
             return render_template("error.html", error="Invalid input type"), 400
 
-        # Load user profile
-        user_profile = get_user_profile(user_id)
+        # Load user profile; read fresh, allergy matching must not use a copy
+        # cached by another worker before the user's last edit
+        user_profile = get_user_profile(user_id, fresh=True)
 
         # Run orchestrator
         with scan_latency.time():
@@ -146,6 +241,9 @@ def scan():
             user_profile=user_profile,
         )
 
+    except RequestEntityTooLarge:
+        raise
+
     except Exception as e:
         scan_errors_total.inc()
         logger.error(f"[{trace_id}] Scan endpoint failed: {e}", exc_info=True)
@@ -169,7 +267,7 @@ def profile():
             ),
             "explain_level": request.form.get("explain_level", "detailed"),
             "data_consent": request.form.get("data_consent") == "on",
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
         }
 
         # Parse allergies
@@ -198,11 +296,16 @@ def profile():
 
         return redirect(url_for("profile"))
 
-    # GET request
-    profile_data = get_user_profile(user_id)
+    # GET request; the post-save redirect may land on a worker whose cache
+    # predates the write, so always read through
+    profile_data = get_user_profile(user_id, fresh=True)
     return render_template("profile.html", profile=profile_data)
 
 
+# Fields rendered by templates/history.html
+HISTORY_LIST_FIELDS = ["timestamp", "summary", "verdict"]
+
+
 @app.route("/history")
 def history():
     """Scan history page."""
@@ -213,10 +316,23 @@ def history():
     if request.args.get("verdict"):
         filters["verdict"] = request.args.get("verdict")
 
-    # Fetch history
-    scan_history = db.get_scan_history(user_id, filters)
+    # Fetch one page of history, only the fields the list shows
+    try:
+        scan_history, next_page_token = db.get_scan_history(
+            user_id,
+            filters,
+            page_token=request.args.get("page_token") or None,
+            fields=HISTORY_LIST_FIELDS,
+        )
+    except ValueError:
+        abort(400, description="Invalid page token")
 
-    return render_template("history.html", scans=scan_history, filters=filters)
+    return render_template(
+        "history.html",
+        scans=scan_history,
+        filters=filters,
+        next_page_token=next_page_token,
+    )
 
 
 @app.route("/review", methods=["POST"])
@@ -243,6 +359,70 @@ def review():
         return render_template("error.html", error="Invalid action"), 400
 
 
+def _parse_expected_flags(raw: str) -> dict:
+    """Parse the expected_ingredient_flags column without executing it."""
+    raw = raw or "{}"
+    try:
+        return json.loads(raw)
+    except ValueError:
+        # Older datasets may use Python dict literals (single quotes)
+        return literal_eval(raw)
+
+
+def _evaluate_golden_row(evaluator: EvaluatorAgent, row: dict, row_number: int):
+    """Scan and judge one golden dataset row; returns (result row, verdict matched)."""
+    # Create mock user profile for test
+    test_profile = default_profile()
+
+    # Run scan
+    try:
+        scan_result = orchestrator.run_scan(
+            "evaluator",
+            {
+                "input_type": "text",
+                "raw_input": row.get("input_text_or_image_url", ""),
+                "user_profile": test_profile,
+            },
+        )
+
+        # Evaluate
+        expected = {
+            "expected_verdict": row.get("expected_verdict"),
+            "expected_ingredient_flags": _parse_expected_flags(
+                row.get("expected_ingredient_flags")
+            ),
+        }
+
+        eval_result = evaluator.evaluate(scan_result.get("final_verdict", {}), expected)
+
+        actual_verdict = scan_result.get("final_verdict", {}).get("verdict")
+
+        return (
+            {
+                "id": row.get("id", row_number),
+                "input": row.get("input_text_or_image_url", "")[:50] + "...",
+                "expected": expected["expected_verdict"],
+                "actual": actual_verdict,
+                "score": eval_result["score"],
+                "feedback": eval_result["feedback"],
+            },
+            actual_verdict == expected["expected_verdict"],
+        )
+
+    except Exception as e:
+        return (
+            {
+                "id": row.get("id", row_number),
+                "input": row.get("input_text_or_image_url", "")[:50] + "...",
+                "expected": row.get("expected_verdict"),
+                "actual": "ERROR",
+                "score": 0,
+                "feedback": str(e),
+            },
+            False,
+        )
+
+
 @app.route("/admin/evaluate", methods=["GET", "POST"])
 def admin_evaluate():
     """
@@ -257,80 +437,34 @@ def admin_evaluate():
         if file.filename == "":
             return render_template("admin.html", error="No file selected"), 400
 
-        # Save file temporarily
-        import tempfile
-        import csv
-
-        # Read CSV
-        csv_content = file.read().decode("utf-8")
-        csv_reader = csv.DictReader(csv_content.splitlines())
+        # Stream rows from the upload instead of buffering the whole file
+        csv_reader = csv.DictReader(
+            io.TextIOWrapper(file.stream, encoding="utf-8", newline="")
+        )
 
-        # Run evaluation
+        # Run evaluation; scans and LLM judging are I/O-bound, so rows run in parallel
         evaluator = EvaluatorAgent()
-        results = []
         total_score = 0
         correct_verdicts = 0
-        total_tests = 0
-
-        for row in csv_reader:
-            total_tests += 1
 
-            # Create mock user profile for test
-            test_profile = DEFAULT_PROFILE.copy()
-
-            # Run scan
-            try:
-                scan_result = orchestrator.run_scan(
-                    "evaluator",
-                    {
-                        "input_type": "text",
-                        "raw_input": row.get("input_text_or_image_url", ""),
-                        "user_profile": test_profile,
-                    },
+        max_workers = int(os.getenv("ADMIN_EVAL_WORKERS", "16"))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_evaluate_golden_row, evaluator, row, row_number): (
+                    row_number
                 )
-
-                # Evaluate
-                expected = {
-                    "expected_verdict": row.get("expected_verdict"),
-                    "expected_ingredient_flags": eval(
-                        row.get("expected_ingredient_flags", "{}")
-                    ),
-                }
-
-                eval_result = evaluator.evaluate(
-                    scan_result.get("final_verdict", {}), expected
-                )
-
-                total_score += eval_result["score"]
-                if (
-                    scan_result.get("final_verdict", {}).get("verdict")
-                    == expected["expected_verdict"]
-                ):
+                for row_number, row in enumerate(csv_reader, start=1)
+            }
+            total_tests = len(futures)
+            results = [None] * total_tests
+
+            for future in as_completed(futures):
+                row_result, correct = future.result()
+                results[futures[future] - 1] = row_result
+                total_score += row_result["score"]
+                if correct:
                     correct_verdicts += 1
 
-                results.append(
-                    {
-                        "id": row.get("id", total_tests),
-                        "input": row.get("input_text_or_image_url", "")[:50] + "...",
-                        "expected": expected["expected_verdict"],
-                        "actual": scan_result.get("final_verdict", {}).get("verdict"),
-                        "score": eval_result["score"],
-                        "feedback": eval_result["feedback"],
-                    }
-                )
-
-            except Exception as e:
-                results.append(
-                    {
-                        "id": row.get("id", total_tests),
-                        "input": row.get("input_text_or_image_url", "")[:50] + "...",
-                        "expected": row.get("expected_verdict"),
-                        "actual": "ERROR",
-                        "score": 0,
-                        "feedback": str(e),
-                    }
-                )
-
         # Calculate metrics
         avg_score = total_score / total_tests if total_tests > 0 else 0
         accuracy = correct_verdicts / total_tests if total_tests > 0 else 0
@@ -353,16 +487,47 @@ def metrics():
     """
     Prometheus metrics endpoint for monitoring application health.
     """
-    return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+    now = time.monotonic()
+    with _metrics_lock:
+        if now >= _metrics_snapshot["expires"]:
+            body = generate_latest()
+            _metrics_snapshot["body"] = body
+            _metrics_snapshot["etag"] = hashlib.sha1(body).hexdigest()
+            _metrics_snapshot["expires"] = now + METRICS_CACHE_SECONDS
+        body = _metrics_snapshot["body"]
+        etag = _metrics_snapshot["etag"]
+
+    # Unchanged snapshots answer If-None-Match with 304 Not Modified
+    response = make_response(body, 200, {"Content-Type": CONTENT_TYPE_LATEST})
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+
+def get_json_body():
+    """
+    Parse the JSON body once; returns None if the payload is too large.
+
+    Anything but a JSON object (invalid JSON, [], "x", ...) comes back as {},
+    which the endpoints reject with 400.
+    """
+    if request.content_length and request.content_length > MAX_JSON_BYTES:
+        return None
+    data = request.get_json(cache=True, silent=True)
+    return data if isinstance(data, dict) else {}
 
 
 @app.route("/api/save_to_history", methods=["POST"])
 def api_save_to_history():
     """API endpoint to save scan to history."""
     user_id = get_or_create_user_id()
-    data = request.json
+    data = get_json_body()
+    if data is None:
+        return jsonify({"success": False, "error": "Payload too large"}), 413
+    if not data:
+        return jsonify({"success": False, "error": "Missing scan data"}), 400
 
-    scan_id = db.save_scan_history(user_id, data)
+    # sync: the client is told the entry was saved
+    scan_id = db.save_scan_history(user_id, data, sync=True)
 
     return jsonify({"success": True, "scan_id": scan_id})
 
@@ -371,12 +536,18 @@ def api_save_to_history():
 def api_block_ingredient():
     """API endpoint to add ingredient to blocklist."""
     user_id = get_or_create_user_id()
-    ingredient = request.json.get("ingredient")
+    data = get_json_body()
+    if data is None:
+        return jsonify({"success": False, "error": "Payload too large"}), 413
+
+    ingredient = data.get("ingredient")
+    if isinstance(ingredient, str):
+        ingredient = ingredient.strip()
+    if not ingredient or not isinstance(ingredient, str):
+        return jsonify({"success": False, "error": "Missing ingredient"}), 400
 
-    profile = get_user_profile(user_id)
-    if ingredient not in profile.get("ingredient_blocklist", []):
-        profile.setdefault("ingredient_blocklist", []).append(ingredient)
-        db.save_user(user_id, profile)
+    # Single atomic array-union write; no profile read needed
+    db.add_to_blocklist(user_id, ingredient)
 
     return jsonify({"success": True})
 
@@ -393,6 +564,11 @@ def not_found(e):
     return render_template("error.html", error="Page not found"), 404
 
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return render_template("error.html", error="Upload too large"), 413
+
+
 @app.errorhandler(500)
 def internal_error(e):
     return render_template("error.html", error="Internal server error"), 500
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration for Label Detective.
+
+Usage: gunicorn app:app
+
+preload_app imports app.py once in the master, so .env loading, ingredient
+data and the orchestrator are built a single time and shared copy-on-write
+by every worker instead of being rebuilt N times.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+# The preloaded app must not open gRPC channels in the master (they don't
+# survive fork); app.init_services skips Firestore and post_fork sets it up
+os.environ["LD_DEFER_DB_INIT"] = "1"
+
+
+def post_fork(server, worker):
+    """Give each worker its own Firestore client; gRPC channels are not fork-safe."""
+    from utils import firestore_client as db
+
+    db.initialize_db()
+
+    # Optional per-worker warm-up (Vision client, lookup caches), LD_WARMUP=1
+    if os.getenv("LD_WARMUP") == "1":
+        from orchestrator.warmup import warmup
+
+        warmup()
+
+
+def worker_exit(server, worker):
+    """Wait for background Firestore writes before the worker goes away."""
+    from utils import firestore_client as db
+
+    db.flush_pending_writes(timeout=worker.cfg.graceful_timeout)
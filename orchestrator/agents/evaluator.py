@@ -4,11 +4,29 @@ Evaluator Agent - Automated output assessment for quality control.
 
 import os
 import json
+import threading
 from typing import Dict, Any
 from utils.logging_utils import get_logger
 
 logger = get_logger("agents.evaluator")
 
+# Configured once and shared by every evaluation in the process
+_GENAI_MODEL = None
+_GENAI_MODEL_LOCK = threading.Lock()
+
+
+def _get_genai_model():
+    """Configure GenAI and build the judge model on first use."""
+    global _GENAI_MODEL
+    if _GENAI_MODEL is None:
+        with _GENAI_MODEL_LOCK:
+            if _GENAI_MODEL is None:
+                import google.generativeai as genai
+
+                genai.configure(api_key=os.getenv("GENAI_API_KEY"))
+                _GENAI_MODEL = genai.GenerativeModel("gemini-pro")
+    return _GENAI_MODEL
+
 
 class EvaluatorAgent:
     """Evaluates agent output against golden answers or rubrics."""
@@ -24,12 +42,7 @@ class EvaluatorAgent:
     ) -> Dict[str, Any]:
         """Evaluate using GenAI LLM."""
         try:
-            import google.generativeai as genai
-
-            api_key = os.getenv("GENAI_API_KEY")
-            genai.configure(api_key=api_key)
-
-            model = genai.GenerativeModel("gemini-pro")
+            model = _get_genai_model()
 
             prompt = f"""You are an expert evaluator for a food label analysis system.
 
@@ -2,12 +2,20 @@
 Explain Agent -> Formats verdict and generates user-friendly explanations.
 """
 
+from operator import itemgetter
 from typing import Dict, List, Any
 from orchestrator import tools
 from utils.logging_utils import get_logger
 
 logger = get_logger("agents.explain")
 
+# Ingredient table sort order: most severe conflicts first
+_CONFLICT_PRIORITY = {"avoid": 0, "caution": 1, "none": 2}
+
+# Badge shown next to each conflict in detailed explanations
+_SEVERITY_BADGE = {"high": "🔴"}
+_DEFAULT_BADGE = "🟡"
+
 
 class ExplainAgent:
     """Formats verdicts and explanations for users."""
@@ -20,20 +28,20 @@ class ExplainAgent:
         trace_id: str,
     ) -> Dict[str, Any]:
         """Generate user-facing explanation with adaptive detail level."""
-        logger.info(
-            f"[{trace_id}] Generating explanation (level: {user_profile.get('explain_level', 'detailed')})"
-        )
-
         explain_level = user_profile.get("explain_level", "detailed")
         verdict = match_result["overall_verdict"]
         conflicts = match_result["conflicts"]
+        safe_count = match_result.get("safe_count", 0)
+        max_severity = match_result.get("max_severity", "low")
+
+        logger.info(f"[{trace_id}] Generating explanation (level: {explain_level})")
 
         if explain_level == "brief":
             explanation = self._generate_brief(verdict, conflicts)
         elif explain_level == "citations_only":
             explanation = self._generate_citations_only(conflicts)
         else:  # detailed
-            explanation = self._generate_detailed(verdict, conflicts, match_result)
+            explanation = self._generate_detailed(verdict, conflicts, safe_count)
 
         alternatives = []
         if conflicts:
@@ -44,20 +52,18 @@ class ExplainAgent:
             alternatives = tools.suggest_alternatives(conflict_tags, "food")
 
         # Build ingredient table
-        ingredient_table = self._build_ingredient_table(
-            ingredient_data, match_result["conflicts"]
-        )
+        ingredient_table = self._build_ingredient_table(ingredient_data, conflicts)
 
         return {
             "verdict": verdict,
-            "severity": match_result.get("max_severity", "low"),
+            "severity": max_severity,
             "summary": explanation["summary"],
             "details": explanation["details"],
             "ingredient_table": ingredient_table,
             "alternatives": alternatives,
             "evidence_urls": explanation.get("evidence_urls", []),
             "conflict_count": len(conflicts),
-            "safe_count": match_result.get("safe_count", 0),
+            "safe_count": safe_count,
         }
 
     def _generate_brief(self, verdict: str, conflicts: List[Dict]) -> Dict[str, Any]:
@@ -84,32 +90,28 @@ class ExplainAgent:
         }
 
     def _generate_detailed(
-        self, verdict: str, conflicts: List[Dict], match_result: Dict
+        self, verdict: str, conflicts: List[Dict], safe_count: int
     ) -> Dict[str, Any]:
         """Generate detailed explanation."""
         if verdict == "safe":
             summary = "✓ This product appears safe based on your profile."
-            details = f"All {match_result.get('safe_count', 0)} ingredients checked. No conflicts detected."
+            details = f"All {safe_count} ingredients checked. No conflicts detected."
 
         elif verdict == "caution":
             summary = f"⚠ Caution recommended - {len(conflicts)} ingredient(s) may be of concern."
-            details_list = []
-            for conflict in conflicts:
-                details_list.append(
-                    f"• **{conflict['ingredient']}**: {conflict['reason']}"
-                )
-            details = "\n".join(details_list)
+            details = "\n".join(
+                f"• **{conflict['ingredient']}**: {conflict['reason']}"
+                for conflict in conflicts
+            )
 
         else:  # avoid
             summary = f"✗ Not recommended - {len(conflicts)} conflicting ingredient(s) detected."
-            details_list = []
-            for conflict in conflicts:
-                severity_badge = "🔴" if conflict["severity"] == "high" else "🟡"
-                details_list.append(
-                    f"{severity_badge} **{conflict['ingredient']}** (Severity: {conflict['severity']})\n"
-                    f"   Reason: {conflict['reason']}"
-                )
-            details = "\n\n".join(details_list)
+            details = "\n\n".join(
+                f"{_SEVERITY_BADGE.get(conflict['severity'], _DEFAULT_BADGE)} "
+                f"**{conflict['ingredient']}** (Severity: {conflict['severity']})\n"
+                f"   Reason: {conflict['reason']}"
+                for conflict in conflicts
+            )
 
         return {"summary": summary, "details": details}
 
@@ -119,22 +121,37 @@ class ExplainAgent:
         """Build per-ingredient table for display."""
         conflict_map = {c["ingredient"]: c for c in conflicts}
 
-        table = []
+        # (priority, row) pairs so the sort key never lands in the row itself
+        ranked = []
         for ingredient, facts in ingredient_data.items():
             conflict = conflict_map.get(ingredient)
-
-            row = {
-                "canonical_name": ingredient,
-                "tags": ", ".join(facts.get("tags", [])),
-                "conflict": conflict["conflict_level"] if conflict else "none",
-                "severity": conflict["severity"] if conflict else "",
-                "reason": conflict["reason"] if conflict else "OK",
-                "evidence": facts.get("evidence", []),
-            }
-            table.append(row)
-
-        # Sort by conflict level
-        priority = {"avoid": 0, "caution": 1, "none": 2}
-        table.sort(key=lambda x: priority.get(x["conflict"], 3))
+            tags = ", ".join(facts.get("tags", []))
+            evidence = facts.get("evidence", [])
+
+            if conflict:
+                conflict_level = conflict["conflict_level"]
+                row = {
+                    "canonical_name": ingredient,
+                    "tags": tags,
+                    "conflict": conflict_level,
+                    "severity": conflict["severity"],
+                    "reason": conflict["reason"],
+                    "evidence": evidence,
+                }
+                ranked.append((_CONFLICT_PRIORITY.get(conflict_level, 3), row))
+            else:
+                row = {
+                    "canonical_name": ingredient,
+                    "tags": tags,
+                    "conflict": "none",
+                    "severity": "",
+                    "reason": "OK",
+                    "evidence": evidence,
+                }
+                ranked.append((_CONFLICT_PRIORITY["none"], row))
+
+        # Sort by conflict level (stable, so label order is kept within a level)
+        ranked.sort(key=itemgetter(0))
+        table = [row for _, row in ranked]
 
         return table
@@ -9,6 +9,24 @@ from utils.logging_utils import get_logger
 
 logger = get_logger("agents.extractor")
 
+# Common junk text found on labels, removed in a single pass
+_CLEAN_RE = re.compile(
+    r"""
+    ingredients?\s*:        # "Ingredients:"
+    | contains?\s*:         # "Contains:"
+    | net\s+weight.+        # "Net weight..."
+    | product\s+of.+        # "Product of..."
+    | best\s+before.+       # "Best before..."
+    | store\s+in.+          # "Store in..."
+    | allergen\s+info.+     # "Allergen info..."
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+_WS_RE = re.compile(r"\s+")
+_SPLIT_RE = re.compile(r"[,;]\s*")
+# Also covers percentages such as "(12%)"
+_PAREN_RE = re.compile(r"\([^)]*\)")
+
 
 class ExtractorAgent:
     """Extracts and cleans ingredient lists from various input types."""
@@ -92,23 +110,10 @@ class ExtractorAgent:
             Cleaned text containing only ingredients
         """
         # Remove common non-ingredient prefixes
-        # Common junk text found on labels
-        patterns_to_remove = [
-            r"ingredients?\s*:",  # "Ingredients:"
-            r"contains?\s*:",  # "Contains:"
-            r"net\s+weight.+",  # "Net weight..."
-            r"product\s+of.+",  # "Product of..."
-            r"best\s+before.+",  # "Best before..."
-            r"store\s+in.+",  # "Store in..."
-            r"allergen\s+info.+",  # "Allergen info..."
-        ]
-
-        cleaned = text
-        for pattern in patterns_to_remove:
-            cleaned = re.sub(pattern, "", cleaned, flags=re.IGNORECASE)
+        cleaned = _CLEAN_RE.sub("", text)
 
         # Remove extra whitespace
-        cleaned = re.sub(r"\s+", " ", cleaned).strip()
+        cleaned = _WS_RE.sub(" ", cleaned).strip()
 
         return cleaned
 
@@ -122,22 +127,13 @@ class ExtractorAgent:
         Returns:
             List of individual ingredients
         """
-        # Split by common delimiters
-        ingredients = re.split(r"[,;]\s*", text)
-
-        # Clean each ingredient
-        cleaned_ingredients = []
-        for ing in ingredients:
-            ing = ing.strip()
-
-            # Remove percentages and quantities in parentheses
-            ing = re.sub(r"\([^)]*%[^)]*\)", "", ing)
-            ing = re.sub(r"\([^)]*\)", "", ing)
-
-            # Remove trailing periods
-            ing = ing.rstrip(".")
-
-            if ing and len(ing) > 1:  # Skip empty or single-char strings
-                cleaned_ingredients.append(ing)
-
-        return cleaned_ingredients
+        # Split first so sub-ingredients like "Chocolate (sugar, milk)" stay
+        # visible to allergen matching, then drop parenthesised quantities
+        # and trailing periods
+        candidates = (
+            _PAREN_RE.sub("", ing.strip()).rstrip(".").strip()
+            for ing in _SPLIT_RE.split(text)
+        )
+
+        # Skip empty or single-char strings
+        return [ing for ing in candidates if len(ing) > 1]
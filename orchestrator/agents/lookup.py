@@ -4,13 +4,30 @@ Lookup Agent -> Knowledge retrieval specialist with parallel execution.
 
 import os
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Any
 from orchestrator import tools
 from utils.logging_utils import get_logger
 
 logger = get_logger("agents.lookup")
 
+# Shared across scans so worker threads are not re-spawned per request
+_LOOKUP_POOL = None
+_LOOKUP_POOL_LOCK = threading.Lock()
+
+
+def _get_lookup_pool(max_workers: int) -> ThreadPoolExecutor:
+    """Create the shared lookup pool on first use (after .env is loaded)."""
+    global _LOOKUP_POOL
+    if _LOOKUP_POOL is None:
+        with _LOOKUP_POOL_LOCK:
+            if _LOOKUP_POOL is None:
+                _LOOKUP_POOL = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="lookup"
+                )
+    return _LOOKUP_POOL
+
 
 class LookupAgent:
     """Looks up ingredient facts from local DB or web sources."""
@@ -22,31 +39,48 @@ class LookupAgent:
         self, canonical_ingredients: List[str], trace_id: str
     ) -> Dict[str, Any]:
         """Parallel ingredient lookup for faster processing."""
+        if not canonical_ingredients:
+            return {"ingredient_data": {}, "lookup_count": 0, "avg_confidence": 0.0}
+
         logger.info(
             f"[{trace_id}] Looking up {len(canonical_ingredients)} ingredients (max parallel: {self.max_parallel})"
         )
 
-        ingredient_data = {}
+        # Local facts resolve in one pass; only misses need the slow web path
+        found, missing = tools.lookup_ingredients_bulk(canonical_ingredients)
+
+        if missing:
+            logger.info(
+                f"[{trace_id}] {len(missing)} ingredients not in local database, using web lookup"
+            )
 
-        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+        if len(missing) == 1:
+            # Pool dispatch costs more than it saves for a single lookup
+            ingredient = missing[0]
+            try:
+                found[ingredient] = self._lookup_single(ingredient, trace_id)
+            except Exception as e:
+                logger.error(f"[{trace_id}] Lookup failed for {ingredient}: {e}")
+                found[ingredient] = self._lookup_error(e)
+
+        elif missing:
+            pool = _get_lookup_pool(self.max_parallel)
             futures = {
-                executor.submit(self._lookup_single, ingredient, trace_id): ingredient
-                for ingredient in canonical_ingredients
+                pool.submit(self._lookup_single, ingredient, trace_id): ingredient
+                for ingredient in missing
             }
 
-            for future in futures:
+            # Collect in completion order so slow web lookups don't block fast ones
+            for future in as_completed(futures):
                 ingredient = futures[future]
                 try:
-                    result = future.result()
-                    ingredient_data[ingredient] = result
+                    found[ingredient] = future.result()
                 except Exception as e:
                     logger.error(f"[{trace_id}] Lookup failed for {ingredient}: {e}")
-                    ingredient_data[ingredient] = {
-                        "tags": ["lookup-error"],
-                        "summary": f"Failed to retrieve information: {str(e)}",
-                        "evidence": [],
-                        "confidence": 0.0,
-                    }
+                    found[ingredient] = self._lookup_error(e)
+
+        # Keep label order for the matcher and ingredient table
+        ingredient_data = {name: found[name] for name in canonical_ingredients}
 
         return {
             "ingredient_data": ingredient_data,
@@ -54,11 +88,18 @@ class LookupAgent:
             "avg_confidence": (
                 sum(d.get("confidence", 0) for d in ingredient_data.values())
                 / len(ingredient_data)
-                if ingredient_data
-                else 0.0
             ),
         }
 
     def _lookup_single(self, ingredient: str, trace_id: str) -> Dict[str, Any]:
         """Lookup a single ingredient."""
         return tools.lookup_ingredient(ingredient)
+
+    def _lookup_error(self, error: Exception) -> Dict[str, Any]:
+        """Placeholder facts for an ingredient whose lookup raised."""
+        return {
+            "tags": ["lookup-error"],
+            "summary": f"Failed to retrieve information: {str(error)}",
+            "evidence": [],
+            "confidence": 0.0,
+        }
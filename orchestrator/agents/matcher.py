@@ -17,8 +17,16 @@ class MatcherAgent:
         ingredient_data: Dict[str, Dict],
         user_profile: Dict[str, Any],
         trace_id: str,
+        fast_path: bool = False,
     ) -> Dict[str, Any]:
-        """Match ingredients with user profile for personalized health verdicts."""
+        """
+        Match ingredients with user profile for personalized health verdicts.
+
+        With fast_path=True matching stops at the first high-severity avoid,
+        which already pins the verdict and triggers review; "partial" is then
+        True and conflicts and safe_count cover only the ingredients checked
+        so far (unchecked ingredients are never reported as safe).
+        """
         logger.info(
             f"[{trace_id}] Matching {len(ingredient_data)} ingredients with user profile"
         )
@@ -27,11 +35,19 @@ class MatcherAgent:
         max_severity = "low"
         overall_verdict = "safe"
         requires_review = False
+        partial = False
+        checked_count = 0
+
+        # Normalize the profile once rather than per ingredient
+        profile_sets = tools.preprocess_profile(user_profile)
 
         for ingredient, facts in ingredient_data.items():
             tags = facts.get("tags", [])
 
-            match_result = tools.match_with_profile(tags, user_profile)
+            match_result = tools.match_with_profile(
+                tags, user_profile, profile_sets, short_circuit=fast_path
+            )
+            checked_count += 1
 
             conflict_info = {
                 "ingredient": ingredient,
@@ -59,11 +75,16 @@ class MatcherAgent:
             if match_result["conflict_level"] != "none":
                 conflicts.append(conflict_info)
 
+            if fast_path and requires_review:
+                partial = True
+                break
+
         return {
             "overall_verdict": overall_verdict,
             "max_severity": max_severity,
             "conflicts": conflicts,
-            "safe_count": len(ingredient_data) - len(conflicts),
+            "safe_count": checked_count - len(conflicts),
             "conflict_count": len(conflicts),
             "requires_review": requires_review,
+            "partial": partial,
         }
@@ -16,24 +16,21 @@ class NormalizerAgent:
         """Normalize ingredient list to canonical names."""
         logger.info(f"[{trace_id}] Normalizing {len(ingredients)} ingredients")
 
-        mapping = {}
-        canonical_ingredients = []
-        unmapped = []
+        # One batch call; each distinct name is canonicalized once
+        results = list(zip(ingredients, tools.canonicalize_batch(ingredients)))
 
-        for raw_name in ingredients:
-            result = tools.canonicalize_ingredient(raw_name)
-            canonical_name = result["canonical_name"]
-
-            mapping[raw_name] = {
-                "canonical_name": canonical_name,
+        mapping = {
+            raw_name: {
+                "canonical_name": result["canonical_name"],
                 "synonyms": result["synonyms"],
                 "source": result["source"],
             }
-
-            canonical_ingredients.append(canonical_name)
-
-            if result["source"] == "unknown":
-                unmapped.append(raw_name)
+            for raw_name, result in results
+        }
+        canonical_ingredients = [result["canonical_name"] for _, result in results]
+        unmapped = [
+            raw_name for raw_name, result in results if result["source"] == "unknown"
+        ]
 
         if unmapped:
             logger.warning(
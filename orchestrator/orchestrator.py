@@ -4,19 +4,79 @@ Coordinates all agents and manages session flow for ingredient analysis.
 """
 
 import time
-from datetime import datetime
-from typing import Dict, Any, Optional
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import count
+from typing import Dict, Any, List, Optional
 from orchestrator.agents.extractor import ExtractorAgent
 from orchestrator.agents.normalizer import NormalizerAgent
 from orchestrator.agents.lookup import LookupAgent
 from orchestrator.agents.matcher import MatcherAgent
 from orchestrator.agents.explain import ExplainAgent
-from orchestrator import tools
 from utils.logging_utils import get_logger, create_trace_id
 from utils import firestore_client as db
 
 logger = get_logger("orchestrator")
 
+# Per-process sequence that makes session ids unique without a second UUID
+_SESSION_SEQ = count(1)
+
+
+def _truncate_raw_input(raw_input: Any, limit: int = 500) -> str:
+    """Short stored form of the scan input; image bytes are never stringified."""
+    if isinstance(raw_input, (bytes, bytearray)):
+        return f"<bytes len={len(raw_input)}>"
+    if isinstance(raw_input, str):
+        return raw_input[:limit]
+    return repr(raw_input)[:limit]
+
+
+class PhaseEvent:
+    """One entry in a session trace; flattened to a dict only when stored."""
+
+    # Plain class: dataclass(slots=True) needs Python 3.10
+    __slots__ = ("agent", "duration_ms", "result_summary", "extras")
+
+    def __init__(
+        self,
+        agent: str,
+        duration_ms: Optional[float] = None,
+        result_summary: str = "",
+        extras: Optional[Dict[str, Any]] = None,
+    ):
+        self.agent = agent
+        self.duration_ms = duration_ms
+        self.result_summary = result_summary
+        self.extras = extras if extras is not None else {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Trace dict as stored in Firestore and rendered in result.html."""
+        data = {"agent": self.agent}
+        if self.duration_ms is not None:
+            data["duration_ms"] = self.duration_ms
+        data["result_summary"] = self.result_summary
+        data.update(self.extras)
+        return data
+
+
+class _PhaseTimer:
+    """Times pipeline phases into a session's event list with a running total."""
+
+    def __init__(self, events: List[PhaseEvent]):
+        self.events = events
+        self.total_ns = 0
+
+    @contextmanager
+    def phase(self, agent: str):
+        """Yield the phase's event; it is timed and appended if the block succeeds."""
+        event = PhaseEvent(agent)
+        start = time.perf_counter_ns()
+        yield event
+        elapsed = time.perf_counter_ns() - start
+        event.duration_ms = elapsed / 1e6
+        self.total_ns += elapsed
+        self.events.append(event)
+
 
 class LabelDetectiveOrchestrator:
     """
@@ -52,14 +112,21 @@ class LabelDetectiveOrchestrator:
         """
         # Initialize session
         trace_id = create_trace_id()
-        session_id = create_trace_id()
+        # 96 random bits from the trace id + a 32-bit process-local sequence
+        session_id = f"{trace_id[:24]}{next(_SESSION_SEQ) & 0xFFFFFFFF:08x}"
+        created_at_ns = time.time_ns()
+        # Naive UTC ISO string, the format history entries and templates expect
+        created_at = datetime.fromtimestamp(created_at_ns / 1e9, timezone.utc).replace(
+            tzinfo=None
+        )
 
         session = {
             "session_id": session_id,
             "trace_id": trace_id,
             "user_id": user_id,
             "input_type": input_payload.get("input_type"),
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": created_at.isoformat(),
+            "created_at_ns": created_at_ns,
             "events": [],
         }
 
@@ -67,22 +134,19 @@ class LabelDetectiveOrchestrator:
             f"[{trace_id}] Starting scan session {session_id} for user {user_id}"
         )
 
+        events: List[PhaseEvent] = []
+        timer = _PhaseTimer(events)
+
         try:
             # Extract ingredients
-            extraction_start = time.time()
-            extraction_result = self.extractor.extract(
-                input_payload["input_type"], input_payload["raw_input"], trace_id
-            )
-            extraction_duration = (time.time() - extraction_start) * 1000
-
-            session["events"].append(
-                {
-                    "agent": "extractor",
-                    "duration_ms": extraction_duration,
-                    "result_summary": f"Extracted {len(extraction_result.get('ingredients', []))} ingredients",
-                    "confidence": extraction_result.get("confidence", 0.0),
-                }
+            with timer.phase("extractor") as event:
+                extraction_result = self.extractor.extract(
+                    input_payload["input_type"], input_payload["raw_input"], trace_id
+                )
+            event.result_summary = (
+                f"Extracted {len(extraction_result.get('ingredients', []))} ingredients"
             )
+            event.extras["confidence"] = extraction_result.get("confidence", 0.0)
 
             ingredients = extraction_result.get("ingredients", [])
             if not ingredients:
@@ -92,98 +156,80 @@ class LabelDetectiveOrchestrator:
                 )
 
             # Normalize ingredients
-            normalization_start = time.time()
-            normalization_result = self.normalizer.normalize(ingredients, trace_id)
-            normalization_duration = (time.time() - normalization_start) * 1000
-
-            session["events"].append(
-                {
-                    "agent": "normalizer",
-                    "duration_ms": normalization_duration,
-                    "result_summary": f"Normalized {len(normalization_result['canonical_ingredients'])} ingredients",
-                    "success_rate": normalization_result["success_rate"],
-                }
-            )
-
+            with timer.phase("normalizer") as event:
+                normalization_result = self.normalizer.normalize(ingredients, trace_id)
             canonical_ingredients = normalization_result["canonical_ingredients"]
+            event.result_summary = (
+                f"Normalized {len(canonical_ingredients)} ingredients"
+            )
+            event.extras["success_rate"] = normalization_result["success_rate"]
 
             # Lookup ingredient facts (parallel)
-            lookup_start = time.time()
-            lookup_result = self.lookup.lookup_all(canonical_ingredients, trace_id)
-            lookup_duration = (time.time() - lookup_start) * 1000
-
-            session["events"].append(
-                {
-                    "agent": "lookup",
-                    "duration_ms": lookup_duration,
-                    "result_summary": f"Looked up {lookup_result['lookup_count']} ingredients",
-                    "avg_confidence": lookup_result["avg_confidence"],
-                }
+            with timer.phase("lookup") as event:
+                # Duplicate canonical names (e.g. two sugars) only need one lookup;
+                # ingredient_data is keyed by name either way
+                unique_ingredients = list(dict.fromkeys(canonical_ingredients))
+                lookup_result = self.lookup.lookup_all(unique_ingredients, trace_id)
+            event.result_summary = (
+                f"Looked up {lookup_result['lookup_count']} ingredients"
             )
+            event.extras["avg_confidence"] = lookup_result["avg_confidence"]
 
             ingredient_data = lookup_result["ingredient_data"]
 
             # Match with user profile
             user_profile = input_payload.get("user_profile", {})
 
-            matching_start = time.time()
-            match_result = self.matcher.match(ingredient_data, user_profile, trace_id)
-            matching_duration = (time.time() - matching_start) * 1000
-
-            session["events"].append(
-                {
-                    "agent": "matcher",
-                    "duration_ms": matching_duration,
-                    "result_summary": f"Verdict: {match_result['overall_verdict']}, Conflicts: {len(match_result['conflicts'])}",
-                    "requires_review": match_result["requires_review"],
-                }
+            with timer.phase("matcher") as event:
+                match_result = self.matcher.match(
+                    ingredient_data, user_profile, trace_id
+                )
+            event.result_summary = (
+                f"Verdict: {match_result['overall_verdict']}, "
+                f"Conflicts: {len(match_result['conflicts'])}"
             )
+            event.extras["requires_review"] = match_result["requires_review"]
 
             # Check if HITL review is needed
+            review = None
             review_id = None
             if match_result["requires_review"]:
                 logger.warning(
                     f"[{trace_id}] High severity detected, creating pending review"
                 )
-                review_id = tools.create_pending_review(
+                review = db.build_pending_review(
                     user_id,
                     session_id,
                     f"High severity allergen detected: {match_result['max_severity']}",
                 )
-
-                session["events"].append(
-                    {
-                        "agent": "hitl",
-                        "review_id": review_id,
-                        "result_summary": "Pending human review",
-                    }
+                review_id = review["review_id"]
+
+                events.append(
+                    PhaseEvent(
+                        "hitl",
+                        result_summary="Pending human review",
+                        extras={"review_id": review_id},
+                    )
                 )
 
             # Generate explanation
-            explain_start = time.time()
-            explanation = self.explainer.explain(
-                match_result, ingredient_data, user_profile, trace_id
-            )
-            explain_duration = (time.time() - explain_start) * 1000
-
-            session["events"].append(
-                {
-                    "agent": "explainer",
-                    "duration_ms": explain_duration,
-                    "result_summary": f"Generated {user_profile.get('explain_level', 'detailed')} explanation",
-                }
+            with timer.phase("explainer") as event:
+                explanation = self.explainer.explain(
+                    match_result, ingredient_data, user_profile, trace_id
+                )
+            event.result_summary = (
+                f"Generated {user_profile.get('explain_level', 'detailed')} explanation"
             )
 
             # Finalize session
+            session["events"] = [event.to_dict() for event in events]
             session["final_verdict"] = explanation
-            session["raw_input"] = str(input_payload.get("raw_input", ""))[
-                :500
-            ]  # Truncate
-
-            # Save session to database
-            db.save_session(session)
+            session["raw_input"] = _truncate_raw_input(
+                input_payload.get("raw_input", "")
+            )
 
             # If not requiring review, save to history automatically
+            history_entry = None
             if not match_result["requires_review"]:
                 history_entry = {
                     "session_id": session_id,
@@ -191,10 +237,12 @@ class LabelDetectiveOrchestrator:
                     "verdict": explanation["verdict"],
                     "timestamp": session["created_at"],
                 }
-                db.save_scan_history(user_id, history_entry)
+
+            # Session, history entry and review land in one batched commit
+            db.commit_scan_atomic(session, history_entry, review)
 
             # Return complete result
-            total_duration = sum(e.get("duration_ms", 0) for e in session["events"])
+            total_duration = timer.total_ns / 1e6
 
             logger.info(f"[{trace_id}] Scan completed in {total_duration:.2f}ms")
 
@@ -211,13 +259,14 @@ class LabelDetectiveOrchestrator:
 
         except Exception as e:
             logger.error(f"[{trace_id}] Scan failed: {e}", exc_info=True)
-            session["events"].append(
-                {
-                    "agent": "orchestrator",
-                    "error": str(e),
-                    "result_summary": "Scan failed",
-                }
+            events.append(
+                PhaseEvent(
+                    "orchestrator",
+                    result_summary="Scan failed",
+                    extras={"error": str(e)},
+                )
             )
+            session["events"] = [event.to_dict() for event in events]
             db.save_session(session)
 
             return {
@@ -8,70 +8,278 @@ import csv
 import json
 import base64
 import re
+import pickle
+import tempfile
+from bisect import bisect_right
+from functools import lru_cache
 from io import BytesIO
-from typing import Dict, List, Any, Optional
+from threading import Lock
+from typing import Dict, FrozenSet, List, Any, NamedTuple, Optional, Tuple
+from cachetools import TTLCache
 from PIL import Image
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from utils.logging_utils import get_logger
 from utils import firestore_client as db
 
+try:
+    import orjson  # optional: faster JSON parsing
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick  # optional: single-pass allergy/blocklist matching
+except ImportError:
+    ahocorasick = None
+
 logger = get_logger("tools")
 
+
+def _json_loads(data: bytes) -> Any:
+    """Parse JSON bytes with orjson when installed, else the stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Shared HTTP session so parallel web lookups reuse pooled TCP/TLS connections
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=32,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=2, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)
+        ),
+    ),
+)
+
+# Vision client is built on first OCR call and reused (gRPC channel + credentials)
+_VISION_CLIENT = None
+_VISION_CLIENT_LOCK = Lock()
+
+# Successful web lookups, reused across scans ("sugar" on 50 labels hits once)
+_WEB_LOOKUP_CACHE = TTLCache(maxsize=2048, ttl=6 * 60 * 60)
+_WEB_LOOKUP_CACHE_LOCK = Lock()
+
 # Load local ingredient data
 INGREDIENT_MAP = {}
 INGREDIENT_FACTS = {}
+INGREDIENT_FACTS_LOWER = {}
+
+# Characters dropped when cleaning a raw ingredient name
+_CLEAN_RE = re.compile(r"[^a-z0-9\s-]")
+
+# Partial-match index over INGREDIENT_MAP keys (see _build_partial_index)
+_PARTIAL_KEYS: List[str] = []
+_PARTIAL_POSITION: Dict[str, int] = {}
+_PARTIAL_BLOB = ""
+_PARTIAL_OFFSETS: List[int] = []
+_PARTIAL_KEY_LENGTHS: List[int] = []
+
+# Parsed data files are pickled here (keyed by source mtime/size) so later
+# imports skip CSV/JSON parsing; set LD_DISABLE_CACHE=1 to always re-parse
+_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+_DATA_CACHE_PATH = os.path.join(_DATA_DIR, ".cache.pkl")
+
+
+def _data_signature(*paths: str) -> Optional[Tuple]:
+    """Return an (mtime_ns, size) fingerprint of the data files, or None."""
+    try:
+        return tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in paths)
+    except OSError:
+        return None
+
+
+def _read_data_cache(signature: Tuple) -> Optional[Dict[str, Any]]:
+    """Return the pickled data if it was built from the current files."""
+    try:
+        with open(_DATA_CACHE_PATH, "rb") as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable ingredient data cache: {e}")
+        return None
+
+    if not isinstance(cached, dict) or cached.get("signature") != signature:
+        return None
+    return cached
+
+
+def _write_data_cache(signature: Tuple):
+    """Atomically write the parsed data; read-only deployments just skip it."""
+    payload = {
+        "signature": signature,
+        "map": INGREDIENT_MAP,
+        "facts": INGREDIENT_FACTS,
+        "facts_lower": INGREDIENT_FACTS_LOWER,
+    }
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=_DATA_DIR, prefix=".cache.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, _DATA_CACHE_PATH)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception as e:
+        logger.warning(f"Could not write ingredient data cache: {e}")
 
 
 def _load_ingredient_data():
-    """Load local CSV and JSON data files."""
-    global INGREDIENT_MAP, INGREDIENT_FACTS
+    """Load local CSV and JSON data files (from the pickle cache when fresh)."""
+    global INGREDIENT_MAP, INGREDIENT_FACTS, INGREDIENT_FACTS_LOWER
+
+    map_path = os.path.join(_DATA_DIR, "ingredient_map.csv")
+    facts_path = os.path.join(_DATA_DIR, "ingredient_facts.json")
+
+    use_cache = not os.getenv("LD_DISABLE_CACHE")
+    signature = _data_signature(map_path, facts_path) if use_cache else None
+    cached = _read_data_cache(signature) if signature else None
+    if cached is not None:
+        INGREDIENT_MAP.update(cached["map"])
+        INGREDIENT_FACTS = cached["facts"]
+        INGREDIENT_FACTS_LOWER = cached["facts_lower"]
+        _build_partial_index()
+        logger.info(
+            f"Loaded {len(INGREDIENT_MAP)} ingredients and "
+            f"{len(INGREDIENT_FACTS)} ingredient facts from cache"
+        )
+        return
 
     # Load ingredient map CSV
-    map_path = os.path.join(
-        os.path.dirname(__file__), "..", "data", "ingredient_map.csv"
-    )
     try:
-        with open(map_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
+        with open(map_path, "r", encoding="utf-8", newline="") as f:
+            # Positional csv.reader avoids DictReader's per-row dict
+            reader = csv.reader(f)
+            header = next(reader)
+            raw_idx, canon_idx, syn_idx, cat_idx = (
+                header.index(column)
+                for column in ("raw_name", "canonical_name", "synonyms", "category")
+            )
             for row in reader:
-                INGREDIENT_MAP[row["raw_name"].lower()] = {
-                    "canonical_name": row["canonical_name"],
-                    "synonyms": row["synonyms"].split("|") if row["synonyms"] else [],
-                    "category": row["category"],
+                if not row:
+                    continue
+                synonyms = row[syn_idx]
+                INGREDIENT_MAP[row[raw_idx].lower()] = {
+                    "canonical_name": row[canon_idx],
+                    "synonyms": synonyms.split("|") if synonyms else [],
+                    "category": row[cat_idx],
                 }
         logger.info(f"Loaded {len(INGREDIENT_MAP)} ingredients from CSV")
+        _build_partial_index()
     except Exception as e:
         logger.error(f"Failed to load ingredient map: {e}")
 
     # Load ingredient facts JSON
-    facts_path = os.path.join(
-        os.path.dirname(__file__), "..", "data", "ingredient_facts.json"
-    )
     try:
-        with open(facts_path, "r", encoding="utf-8") as f:
-            INGREDIENT_FACTS = json.load(f)
+        with open(facts_path, "rb") as f:
+            INGREDIENT_FACTS = _json_loads(f.read())
+        # Case-insensitive index; first spelling wins, as in a linear scan
+        INGREDIENT_FACTS_LOWER = {}
+        for key, value in INGREDIENT_FACTS.items():
+            INGREDIENT_FACTS_LOWER.setdefault(key.lower(), value)
         logger.info(f"Loaded {len(INGREDIENT_FACTS)} ingredient facts from JSON")
     except Exception as e:
         logger.error(f"Failed to load ingredient facts: {e}")
 
+    # Only cache a complete load, never a partial one after an error
+    if signature and INGREDIENT_MAP and INGREDIENT_FACTS:
+        _write_data_cache(signature)
+
+
+def _build_partial_index():
+    """
+    Index INGREDIENT_MAP keys for partial matching.
+
+    Keys are joined with NUL separators (never present in a cleaned name) so
+    a single str.find() finds the first key containing the query, and a
+    key -> position map answers "which keys occur inside the query".
+    """
+    global _PARTIAL_KEYS, _PARTIAL_POSITION, _PARTIAL_BLOB, _PARTIAL_OFFSETS
+    global _PARTIAL_KEY_LENGTHS
+
+    _PARTIAL_KEYS = list(INGREDIENT_MAP)
+    _PARTIAL_POSITION = {key: i for i, key in enumerate(_PARTIAL_KEYS)}
+    _PARTIAL_KEY_LENGTHS = sorted({len(key) for key in _PARTIAL_KEYS})
+    _PARTIAL_OFFSETS = []
+    offset = 0
+    for key in _PARTIAL_KEYS:
+        _PARTIAL_OFFSETS.append(offset)
+        offset += len(key) + 1
+    _PARTIAL_BLOB = "\0".join(_PARTIAL_KEYS)
+    _find_partial_key.cache_clear()
+
+
+@lru_cache(maxsize=4096)
+def _find_partial_key(clean_name: str) -> Optional[str]:
+    """
+    Return the first INGREDIENT_MAP key (in CSV order) that contains clean_name
+    or is contained in it, or None.
+    """
+    best = len(_PARTIAL_KEYS)
+
+    # Earliest key containing the query: first hit in the joined keys
+    pos = _PARTIAL_BLOB.find(clean_name)
+    if pos != -1:
+        best = bisect_right(_PARTIAL_OFFSETS, pos) - 1
+
+    # Keys contained in the query: probe only substrings whose length some
+    # key actually has (O(n * distinct lengths) rather than O(n^2) slices)
+    n = len(clean_name)
+    for length in _PARTIAL_KEY_LENGTHS:
+        if length > n:
+            break
+        for start in range(n - length + 1):
+            i = _PARTIAL_POSITION.get(clean_name[start : start + length])
+            if i is not None and i < best:
+                best = i
+
+    return _PARTIAL_KEYS[best] if best < len(_PARTIAL_KEYS) else None
+
 
 # Load data on module import
 _load_ingredient_data()
 
 
+def _get_vision_client():
+    """Create the Vision API client on first use."""
+    global _VISION_CLIENT
+    if _VISION_CLIENT is None:
+        with _VISION_CLIENT_LOCK:
+            if _VISION_CLIENT is None:
+                from google.cloud import vision
+
+                _VISION_CLIENT = vision.ImageAnnotatorClient()
+    return _VISION_CLIENT
+
+
 def ocr_image(image_bytes: bytes) -> Dict[str, Any]:
     """Extract text from image using Google Vision API."""
     try:
         from google.cloud import vision
 
-        client = vision.ImageAnnotatorClient()
+        client = _get_vision_client()
         image = vision.Image(content=image_bytes)
 
-        response = client.text_detection(image=image)
-        texts = response.text_annotations
+        # Language hints spare Vision its own language auto-detection
+        language_hints = [
+            hint.strip()
+            for hint in os.getenv("OCR_LANGUAGE_HINTS", "en").split(",")
+            if hint.strip()
+        ]
+        response = client.text_detection(
+            image=image,
+            image_context=vision.ImageContext(language_hints=language_hints),
+        )
+        # Full-page text directly, rather than the first of many word annotations
+        detected_text = response.full_text_annotation.text
 
-        if texts:
-            detected_text = texts[0].description
+        if detected_text:
             confidence = 0.9
 
             logger.info(f"Google Vision OCR extracted {len(detected_text)} characters")
@@ -86,10 +294,20 @@ def ocr_image(image_bytes: bytes) -> Dict[str, Any]:
 
 
 def canonicalize_ingredient(raw_name: str) -> Dict[str, Any]:
-    """Map raw ingredient name to canonical form (e.g., E120 -> Cochineal)."""
+    """
+    Map raw ingredient name to canonical form (e.g., E120 -> Cochineal).
+
+    Results are memoized on the lowercased name (common ingredients repeat
+    across labels); treat the returned dict as read-only.
+    """
+    return _canonicalize_impl(raw_name.strip().lower())
+
+
+@lru_cache(maxsize=4096)
+def _canonicalize_impl(name_lower: str) -> Dict[str, Any]:
+    """Normalization core of canonicalize_ingredient, keyed on the lowered name."""
     # Clean the raw name
-    clean_name = raw_name.strip().lower()
-    clean_name = re.sub(r"[^a-z0-9\s-]", "", clean_name)
+    clean_name = _CLEAN_RE.sub("", name_lower)
 
     # Check local map first
     if clean_name in INGREDIENT_MAP:
@@ -101,36 +319,86 @@ def canonicalize_ingredient(raw_name: str) -> Dict[str, Any]:
         }
 
     # Check if it's a partial match (e.g., "e120" matches "E120")
-    for key, data in INGREDIENT_MAP.items():
-        if clean_name in key or key in clean_name:
-            return {
-                "canonical_name": data["canonical_name"],
-                "synonyms": data["synonyms"],
-                "source": "local",
-            }
+    key = _find_partial_key(clean_name)
+    if key is not None:
+        data = INGREDIENT_MAP[key]
+        return {
+            "canonical_name": data["canonical_name"],
+            "synonyms": data["synonyms"],
+            "source": "local",
+        }
 
     # Fallback: return capitalized version as canonical
-    canonical = raw_name.strip().title()
-    logger.warning(f"No canonical mapping found for '{raw_name}', using '{canonical}'")
+    canonical = name_lower.title()
+    logger.warning(
+        f"No canonical mapping found for '{name_lower}', using '{canonical}'"
+    )
 
     return {"canonical_name": canonical, "synonyms": [], "source": "unknown"}
 
 
+canonicalize_ingredient.cache_clear = _canonicalize_impl.cache_clear
+canonicalize_ingredient.cache_info = _canonicalize_impl.cache_info
+
+
+def canonicalize_batch(raw_names: List[str]) -> List[Dict[str, Any]]:
+    """
+    Canonicalize a whole ingredient list, one result per input name.
+
+    Each distinct name is cleaned and resolved once; repeats share the result.
+    """
+    by_name = {name: canonicalize_ingredient(name) for name in dict.fromkeys(raw_names)}
+    return [by_name[name] for name in raw_names]
+
+
+@lru_cache(maxsize=4096)
+def _lookup_local(canonical_name: str) -> Optional[Dict[str, Any]]:
+    """Return local facts for an ingredient, or None if not in the local database."""
+    facts = INGREDIENT_FACTS.get(canonical_name)
+    if facts is None:
+        facts = INGREDIENT_FACTS_LOWER.get(canonical_name.lower())
+    return facts
+
+
 def lookup_ingredient(canonical_name: str) -> Dict[str, Any]:
     """Retrieve ingredient facts and evidence from local database or web search."""
-    # Check local facts first
-    if canonical_name in INGREDIENT_FACTS:
-        return INGREDIENT_FACTS[canonical_name]
-
-    # Try case-insensitive match
-    for key, value in INGREDIENT_FACTS.items():
-        if key.lower() == canonical_name.lower():
-            return value
+    facts = _lookup_local(canonical_name)
+    if facts is not None:
+        return facts
 
     # Use web search for unknown ingredients
     return _lookup_via_web_search(canonical_name)
 
 
+# Local hits are memoized by _lookup_local; web results keep their TTL cache so
+# they still expire.
+lookup_ingredient.cache_clear = _lookup_local.cache_clear
+lookup_ingredient.cache_info = _lookup_local.cache_info
+
+
+def lookup_ingredients_bulk(
+    canonical_names: List[str],
+) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    """
+    Resolve many ingredients against the local database in one pass.
+
+    Args:
+        canonical_names: Canonical ingredient names
+
+    Returns:
+        Tuple of (facts keyed by name, names that still need a web lookup)
+    """
+    found = {}
+    missing = []
+    for name in canonical_names:
+        facts = _lookup_local(name)
+        if facts is not None:
+            found[name] = facts
+        else:
+            missing.append(name)
+    return found, missing
+
+
 def _lookup_via_web_search(ingredient_name: str) -> Dict[str, Any]:
     """
     Lookup ingredient via Google Custom Search API with Wikipedia fallback.
@@ -159,6 +427,11 @@ def _lookup_via_web_search(ingredient_name: str) -> Dict[str, Any]:
             "confidence": 0.6,
         }
 
+    with _WEB_LOOKUP_CACHE_LOCK:
+        cached = _WEB_LOOKUP_CACHE.get(ingredient_name)
+    if cached is not None:
+        return cached
+
     try:
         # Use Google Custom Search API
         url = "https://www.googleapis.com/customsearch/v1"
@@ -169,9 +442,9 @@ def _lookup_via_web_search(ingredient_name: str) -> Dict[str, Any]:
             "num": 3,
         }
 
-        response = requests.get(url, params=params, timeout=5)
+        response = _HTTP_SESSION.get(url, params=params, timeout=5)
         response.raise_for_status()
-        data = response.json()
+        data = _json_loads(response.content)
 
         evidence = [
             {"url": item["link"], "title": item["title"]}
@@ -182,12 +455,16 @@ def _lookup_via_web_search(ingredient_name: str) -> Dict[str, Any]:
             f"Google Search found {len(evidence)} results for {ingredient_name}"
         )
 
-        return {
+        facts = {
             "tags": ["web-lookup"],
             "summary": f"Web information about {ingredient_name} from trusted sources.",
             "evidence": evidence,
             "confidence": 0.7,
         }
+        # Only successful searches are cached; failures retry next time
+        with _WEB_LOOKUP_CACHE_LOCK:
+            _WEB_LOOKUP_CACHE[ingredient_name] = facts
+        return facts
 
     except Exception as e:
         logger.error(f"Google Custom Search failed: {e}")
@@ -205,87 +482,164 @@ def _lookup_via_web_search(ingredient_name: str) -> Dict[str, Any]:
         }
 
 
+# Diet tag -> (tag that conflicts, extra tags of which one must also be
+# present or None, reason). Every diet conflict is "avoid", at least moderate.
+DIET_RULES: Dict[str, Tuple[str, Optional[FrozenSet[str]], str]] = {
+    "vegan": (
+        "animal-derived",
+        None,
+        "Not suitable for vegan diet (contains animal-derived ingredient)",
+    ),
+    "vegetarian": (
+        "animal-derived",
+        frozenset({"fish", "shellfish", "meat"}),
+        "Not suitable for vegetarian diet",
+    ),
+    "gluten-free": ("gluten", None, "Contains gluten"),
+}
+
+
+class ProfileSets(NamedTuple):
+    """User profile fields pre-normalized once per scan for match_with_profile."""
+
+    allergies: Tuple[Tuple[str, str], ...]  # (lowercased name, severity)
+    diet_tags: Tuple[str, ...]
+    sustainability_goals: Tuple[str, ...]
+    blocklist: Tuple[Tuple[str, str], ...]  # (as entered, lowercased)
+    preferences: FrozenSet[str]
+
+
+def preprocess_profile(user_profile: Dict[str, Any]) -> ProfileSets:
+    """
+    Lowercase and index the profile fields match_with_profile checks.
+
+    Uses the lowercased terms db.save_user stores under "_normalized" when
+    they line up with the raw fields; legacy documents are lowercased here.
+    """
+    normalized = user_profile.get("_normalized") or {}
+
+    allergies = user_profile.get("allergies", [])
+    allergens = normalized.get("allergens")
+    if allergens is None or len(allergens) != len(allergies):
+        allergens = [
+            allergy.get("canonical_name", allergy.get("name", "")).lower()
+            for allergy in allergies
+        ]
+
+    blocklist = user_profile.get("ingredient_blocklist", [])
+    blocklist_lower = normalized.get("blocklist")
+    if blocklist_lower is None or len(blocklist_lower) != len(blocklist):
+        blocklist_lower = [blocked.lower() for blocked in blocklist]
+
+    return ProfileSets(
+        allergies=tuple(
+            (allergen, allergy.get("severity", "moderate"))
+            for allergen, allergy in zip(allergens, allergies)
+        ),
+        diet_tags=tuple(user_profile.get("diet_tags", [])),
+        sustainability_goals=tuple(user_profile.get("sustainability_goals", [])),
+        blocklist=tuple(zip(blocklist, blocklist_lower)),
+        preferences=frozenset(user_profile.get("preferences", [])),
+    )
+
+
 def match_with_profile(
-    ingredient_tags: List[str], user_profile: Dict[str, Any]
+    ingredient_tags: List[str],
+    user_profile: Dict[str, Any],
+    profile_sets: Optional[ProfileSets] = None,
+    short_circuit: bool = False,
+) -> Dict[str, Any]:
+    """
+    Compare ingredient tags with user profile to detect conflicts.
+
+    Callers matching many ingredients against one profile should pass
+    profile_sets from preprocess_profile() so it is only built once. With
+    short_circuit=True the check stops at the first high-severity allergy,
+    since nothing later can raise the verdict; the reason then lists only
+    the conflicts found so far.
+
+    Results are memoized on (tags, profile contents), so a profile edit is
+    simply a new key and needs no invalidation.
+    """
+    if profile_sets is None:
+        profile_sets = preprocess_profile(user_profile)
+
+    tags = tuple(ingredient_tags)
+    try:
+        result = _match_cached(tags, profile_sets, short_circuit)
+    except TypeError:
+        # Unhashable values in the profile; match without the cache
+        result = _match_impl(tags, profile_sets, short_circuit)
+    return dict(result)
+
+
+def _match_impl(
+    ingredient_tags: Tuple[str, ...], profile_sets: ProfileSets, short_circuit: bool
 ) -> Dict[str, Any]:
-    """Compare ingredient tags with user profile to detect conflicts."""
+    """Conflict detection behind match_with_profile."""
     conflicts = []
     max_severity = "low"
     conflict_level = "none"
 
-    # Check allergies
-    allergies = user_profile.get("allergies", [])
-    for allergy in allergies:
-        allergy_name = allergy.get("canonical_name", allergy.get("name", "")).lower()
-
-        # Check if any tag matches the allergy
-        for tag in ingredient_tags:
-            if allergy_name in tag.lower() or tag.lower() in allergy_name:
-                severity = allergy.get("severity", "moderate")
-                conflicts.append(
-                    f"Contains allergen: {allergy_name} (severity: {severity})"
-                )
-                conflict_level = "avoid"
-                if severity == "high":
-                    max_severity = "high"
-                elif severity == "moderate" and max_severity != "high":
-                    max_severity = "moderate"
+    tag_set = frozenset(ingredient_tags)
+    lowered_tags = [tag.lower() for tag in ingredient_tags]
+    joined_tags_lower = " ".join(lowered_tags)
 
-    # Check diet tags
-    diet_tags = user_profile.get("diet_tags", [])
-    for diet_tag in diet_tags:
-        if diet_tag == "vegan" and "animal-derived" in ingredient_tags:
-            conflicts.append(
-                "Not suitable for vegan diet (contains animal-derived ingredient)"
-            )
-            conflict_level = "avoid" if conflict_level != "avoid" else conflict_level
-            if max_severity == "low":
-                max_severity = "moderate"
+    allergy_hits, blocked_hits = _find_profile_hits(
+        profile_sets, lowered_tags, joined_tags_lower
+    )
 
-        if diet_tag == "vegetarian" and "animal-derived" in ingredient_tags:
-            # Check if it's meat/fish specifically
-            if (
-                "fish" in ingredient_tags
-                or "shellfish" in ingredient_tags
-                or "meat" in ingredient_tags
-            ):
-                conflicts.append("Not suitable for vegetarian diet")
-                conflict_level = (
-                    "avoid" if conflict_level != "avoid" else conflict_level
-                )
-                if max_severity == "low":
-                    max_severity = "moderate"
-
-        if diet_tag == "gluten-free" and "gluten" in ingredient_tags:
-            conflicts.append("Contains gluten")
+    # Check allergies (substring match both ways, e.g. "eggs" vs "egg")
+    for allergy_index, _ in allergy_hits:
+        allergy_name, severity = profile_sets.allergies[allergy_index]
+        conflicts.append(f"Contains allergen: {allergy_name} (severity: {severity})")
+        conflict_level = "avoid"
+        if severity == "high":
+            max_severity = "high"
+            if short_circuit:
+                return {
+                    "conflict_level": conflict_level,
+                    "severity": max_severity,
+                    "reason": "; ".join(conflicts),
+                }
+        elif severity == "moderate" and max_severity != "high":
+            max_severity = "moderate"
+
+    # Check diet tags
+    for diet_tag in profile_sets.diet_tags:
+        rule = DIET_RULES.get(diet_tag)
+        if rule is None:
+            continue
+        required_tag, any_of_tags, reason = rule
+        if required_tag in tag_set and (
+            any_of_tags is None or not any_of_tags.isdisjoint(tag_set)
+        ):
+            conflicts.append(reason)
             conflict_level = "avoid"
-            if max_severity != "high":
+            if max_severity == "low":
                 max_severity = "moderate"
 
     # Check sustainability goals
-    sustainability_goals = user_profile.get("sustainability_goals", [])
-    for goal in sustainability_goals:
-        if goal == "avoid_palm_oil" and "palm" in " ".join(ingredient_tags).lower():
+    for goal in profile_sets.sustainability_goals:
+        if goal == "avoid_palm_oil" and "palm" in joined_tags_lower:
             conflicts.append("Contains palm oil (sustainability concern)")
             conflict_level = "caution" if conflict_level == "none" else conflict_level
 
-        if goal == "avoid_palm_oil" and "sustainability-concern" in ingredient_tags:
+        if goal == "avoid_palm_oil" and "sustainability-concern" in tag_set:
             conflicts.append("Sustainability concern flagged")
             conflict_level = "caution" if conflict_level == "none" else conflict_level
 
     # Check blocklist
-    blocklist = user_profile.get("ingredient_blocklist", [])
-    for blocked in blocklist:
-        for tag in ingredient_tags:
-            if blocked.lower() in tag.lower():
-                conflicts.append(f"Blocked ingredient: {blocked}")
-                conflict_level = "avoid"
-                if max_severity != "high":
-                    max_severity = "moderate"
+    for blocked_index, _ in blocked_hits:
+        blocked = profile_sets.blocklist[blocked_index][0]
+        conflicts.append(f"Blocked ingredient: {blocked}")
+        conflict_level = "avoid"
+        if max_severity != "high":
+            max_severity = "moderate"
 
     # Synthetic dyes check
-    if any(dye in ingredient_tags for dye in ["dye", "synthetic"]):
-        if "avoid_synthetic_dyes" in user_profile.get("preferences", []):
+    if "dye" in tag_set or "synthetic" in tag_set:
+        if "avoid_synthetic_dyes" in profile_sets.preferences:
             conflicts.append("Contains synthetic dye")
             conflict_level = "caution" if conflict_level == "none" else conflict_level
 
@@ -298,50 +652,147 @@ def match_with_profile(
     }
 
 
-def suggest_alternatives(
-    conflict_tags: List[str], category: str
-) -> List[Dict[str, Any]]:
-    """Suggest alternative products based on detected conflicts."""
-    alternatives = []
-
-    # Simple rule-based alternatives
-    if "palm" in " ".join(conflict_tags).lower():
-        alternatives.append(
-            {
-                "product_name": "Coconut oil-based alternative",
-                "reason": "Palm oil-free, sustainable",
-                "link": "",
-            }
-        )
+_match_cached = lru_cache(maxsize=16384)(_match_impl)
 
-    if "allergen" in " ".join(conflict_tags).lower():
-        alternatives.append(
-            {
-                "product_name": "Allergen-free alternative",
-                "reason": "Free from common allergens",
-                "link": "",
-            }
-        )
 
-    if "animal-derived" in conflict_tags:
-        alternatives.append(
-            {
-                "product_name": "Vegan alternative",
-                "reason": "100% plant-based",
-                "link": "",
-            }
-        )
+@lru_cache(maxsize=256)
+def _profile_automaton(profile_sets: ProfileSets):
+    """
+    Aho-Corasick automaton over a profile's allergy and blocklist terms.
 
-    if "synthetic" in " ".join(conflict_tags).lower() or "dye" in conflict_tags:
-        alternatives.append(
-            {
-                "product_name": "Naturally colored alternative",
-                "reason": "Uses only natural coloring",
-                "link": "",
-            }
-        )
+    Returns (automaton, NUL-joined allergy names) or None when pyahocorasick
+    is unavailable or a term is empty (an empty term matches every tag).
+    """
+    terms: Dict[str, List[Tuple[str, int]]] = {}
+    for i, (allergy_name, _) in enumerate(profile_sets.allergies):
+        terms.setdefault(allergy_name, []).append(("allergy", i))
+    for i, (_, blocked_lower) in enumerate(profile_sets.blocklist):
+        terms.setdefault(blocked_lower, []).append(("blocked", i))
+
+    if ahocorasick is None or not terms or "" in terms:
+        return None
 
-    return alternatives[:3]  # Return top 3
+    automaton = ahocorasick.Automaton()
+    for term, owners in terms.items():
+        automaton.add_word(term, owners)
+    automaton.make_automaton()
+
+    allergy_names = "\0".join(name for name, _ in profile_sets.allergies)
+    return automaton, allergy_names
+
+
+def _find_profile_hits(
+    profile_sets: ProfileSets, lowered_tags: List[str], joined_tags_lower: str
+) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Find (allergy index, tag index) and (blocklist index, tag index) matches.
+
+    Both lists are sorted term-major, the order conflicts are reported in.
+    """
+    try:
+        compiled = _profile_automaton(profile_sets)
+    except TypeError:
+        compiled = None  # unhashable profile values
+
+    if compiled is None:
+        allergy_hits = [
+            (i, t)
+            for i, (allergy_name, _) in enumerate(profile_sets.allergies)
+            for t, tag in enumerate(lowered_tags)
+            if allergy_name in tag or tag in allergy_name
+        ]
+        # Terms absent from the joined tags can skip the per-tag scan
+        blocked_hits = [
+            (i, t)
+            for i, (_, blocked_lower) in enumerate(profile_sets.blocklist)
+            if blocked_lower in joined_tags_lower
+            for t, tag in enumerate(lowered_tags)
+            if blocked_lower in tag
+        ]
+        return allergy_hits, blocked_hits
+
+    automaton, allergy_names = compiled
+    allergy_pairs = set()
+    blocked_pairs = set()
+    for t, tag in enumerate(lowered_tags):
+        # Terms occurring inside the tag, in one pass over the tag
+        for _, owners in automaton.iter(tag):
+            for kind, i in owners:
+                (allergy_pairs if kind == "allergy" else blocked_pairs).add((i, t))
+        # Reverse direction: the tag occurring inside an allergy name
+        if tag in allergy_names:
+            for i, (allergy_name, _) in enumerate(profile_sets.allergies):
+                if tag in allergy_name:
+                    allergy_pairs.add((i, t))
+
+    return sorted(allergy_pairs), sorted(blocked_pairs)
+
+
+def suggest_alternatives(
+    conflict_tags: List[str], category: str
+) -> List[Dict[str, Any]]:
+    """Suggest alternative products based on detected conflicts."""
+    cached = _suggest_alternatives_cached(tuple(conflict_tags), category)
+    return [dict(alternative) for alternative in cached]
+
+
+# (substrings of the joined tags, exact tags, alternative) in suggestion order;
+# a rule fires when any substring or exact tag is present.
+_AlternativeRule = Tuple[Tuple[str, ...], FrozenSet[str], Dict[str, Any]]
+_ALTERNATIVE_RULES: Tuple[_AlternativeRule, ...] = (
+    (
+        ("palm",),
+        frozenset(),
+        {
+            "product_name": "Coconut oil-based alternative",
+            "reason": "Palm oil-free, sustainable",
+            "link": "",
+        },
+    ),
+    (
+        ("allergen",),
+        frozenset(),
+        {
+            "product_name": "Allergen-free alternative",
+            "reason": "Free from common allergens",
+            "link": "",
+        },
+    ),
+    (
+        (),
+        frozenset({"animal-derived"}),
+        {
+            "product_name": "Vegan alternative",
+            "reason": "100% plant-based",
+            "link": "",
+        },
+    ),
+    (
+        ("synthetic",),
+        frozenset({"dye"}),
+        {
+            "product_name": "Naturally colored alternative",
+            "reason": "Uses only natural coloring",
+            "link": "",
+        },
+    ),
+)
+
+
+@lru_cache(maxsize=4096)
+def _suggest_alternatives_cached(
+    conflict_tags: Tuple[str, ...], category: str
+) -> Tuple[Dict[str, Any], ...]:
+    """Rule-based alternatives, memoized on (tags, category); callers copy out."""
+    joined_tags_lower = " ".join(conflict_tags).lower()
+    tag_set = frozenset(conflict_tags)
+    alternatives = [
+        alternative
+        for substrings, exact_tags, alternative in _ALTERNATIVE_RULES
+        if any(term in joined_tags_lower for term in substrings)
+        or not exact_tags.isdisjoint(tag_set)
+    ]
+    return tuple(alternatives[:3])  # Return top 3
 
 
 def save_user_event(user_id: str, event_dict: Dict[str, Any]) -> None:
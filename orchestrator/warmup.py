@@ -0,0 +1,44 @@
+"""
+Worker warm-up for Label Detective.
+Pays one-off costs (data load, Vision client, lookup caches) before the first request.
+"""
+
+import time
+from utils.logging_utils import get_logger
+
+logger = get_logger("warmup")
+
+# Frequent label ingredients, warmed through the same path real scans take
+_COMMON_INGREDIENTS = ["sugar", "salt", "water", "palm oil", "soy lecithin"]
+
+
+def warmup() -> float:
+    """
+    Preload ingredient data, the Vision client and canonicalization caches.
+
+    Call after fork (see gunicorn.conf.py): the Vision client holds a gRPC
+    channel, which must be created in the process that uses it.
+
+    Returns:
+        Warm-up duration in milliseconds
+    """
+    start = time.perf_counter()
+
+    # Importing tools loads ingredient data and builds the partial-match index
+    from orchestrator import tools
+
+    # Scans look up canonical names, so warm those keys, not the raw ones
+    canonical = tools.canonicalize_batch(_COMMON_INGREDIENTS)
+    tools.lookup_ingredients_bulk(
+        list(dict.fromkeys(entry["canonical_name"] for entry in canonical))
+    )
+
+    try:
+        tools._get_vision_client()
+    except Exception as e:
+        # No credentials locally is fine; OCR will report the error per request
+        logger.warning(f"Vision client warm-up skipped: {e}")
+
+    duration_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"Warm-up completed in {duration_ms:.2f}ms")
+    return duration_ms
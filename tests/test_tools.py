@@ -1,3 +1,11 @@
+"""
+Unit tests for Label Detective tool functions.
+"""
+
+import pytest
+from orchestrator import tools
+
+
 def test_canonicalize_e_number():
     """Test E-number canonicalization."""
     result = tools.canonicalize_ingredient("E1520")
@@ -12,6 +20,26 @@ def test_canonicalize_common_allergen():
     assert result["source"] == "local"
 
 
+def test_canonicalize_partial_match():
+    """Test partial matches in both directions resolve via the local map."""
+    carmine = tools.canonicalize_ingredient("Carmine colour")
+    cochineal = tools.canonicalize_ingredient("120")
+
+    assert carmine["canonical_name"] == "Carmine"
+    assert cochineal["canonical_name"] == "Cochineal"
+
+
+def test_canonicalize_batch():
+    """Test batch canonicalization keeps input order and repeats."""
+    results = tools.canonicalize_batch(["E1520", "Peanut Oil", "E1520"])
+
+    assert [r["canonical_name"] for r in results] == [
+        "Propylene glycol",
+        "Peanut oil",
+        "Propylene glycol",
+    ]
+
+
 def test_lookup_ingredient_local():
     """Test ingredient lookup from local database."""
     result = tools.lookup_ingredient("Peanut oil")
@@ -20,6 +48,17 @@ def test_lookup_ingredient_local():
     assert len(result["evidence"]) > 0
 
 
+def test_lookup_ingredients_bulk():
+    """Test bulk lookup splits local hits from web-lookup misses."""
+    found, missing = tools.lookup_ingredients_bulk(
+        ["Peanut oil", "peanut OIL", "NonExistentIngredient12345"]
+    )
+
+    assert "allergen" in found["Peanut oil"]["tags"]
+    assert found["peanut OIL"] is found["Peanut oil"]
+    assert missing == ["NonExistentIngredient12345"]
+
+
 def test_match_with_profile_severe_allergy():
     """Test profile matching with severe allergy."""
     user_profile = {
@@ -57,6 +96,23 @@ def test_match_with_profile_vegan():
     assert "vegan" in result["reason"].lower()
 
 
+def test_match_with_profile_vegetarian():
+    """Test vegetarian diet only flags meat/fish, not all animal-derived tags."""
+    user_profile = {
+        "allergies": [],
+        "diet_tags": ["vegetarian"],
+        "sustainability_goals": [],
+        "ingredient_blocklist": [],
+    }
+
+    dairy = tools.match_with_profile(["animal-derived", "dairy"], user_profile)
+    fish = tools.match_with_profile(["animal-derived", "fish"], user_profile)
+
+    assert dairy["conflict_level"] == "none"
+    assert fish["conflict_level"] == "avoid"
+    assert fish["severity"] == "moderate"
+
+
 def test_match_with_profile_palm_oil_sustainability():
     """Test palm oil sustainability matching."""
     user_profile = {
@@ -115,13 +171,19 @@ def test_canonicalize_unknown_ingredient():
     assert result["source"] == "unknown"
 
 
-def test_lookup_missing_ingredient():
-    """Test lookup of missing ingredient."""
+def test_lookup_missing_ingredient(monkeypatch):
+    """Test lookup of missing ingredient falls back to Wikipedia."""
+    # Without Custom Search credentials no network call is made
+    monkeypatch.delenv("GOOGLE_SEARCH_API_KEY", raising=False)
+    monkeypatch.delenv("GOOGLE_SEARCH_ENGINE_ID", raising=False)
+
     result = tools.lookup_ingredient("NonExistentIngredient12345")
 
-    # Should return minimal data
-    assert "unknown" in result["tags"] or "lookup-failed" in result["tags"]
-    assert result["confidence"] < 0.5
+    # Should return minimal, unverified fallback data
+    assert "unknown" in result["tags"]
+    assert "web-lookup" in result["tags"]
+    assert result["confidence"] == 0.6
+    assert any("wikipedia.org" in e["url"] for e in result["evidence"])
 
 
 def test_blocklist_matching():
@@ -161,6 +223,56 @@ def test_multiple_allergies():
     assert result["severity"] == "high"
 
 
+def test_match_with_profile_short_circuit():
+    """Test short_circuit stops at the first high-severity allergy."""
+    user_profile = {
+        "allergies": [
+            {"name": "Peanut", "severity": "high", "canonical_name": "peanut"}
+        ],
+        "diet_tags": ["vegan"],
+        "sustainability_goals": [],
+        "ingredient_blocklist": [],
+    }
+    ingredient_tags = ["peanut", "animal-derived"]
+
+    full = tools.match_with_profile(ingredient_tags, user_profile)
+    fast = tools.match_with_profile(ingredient_tags, user_profile, short_circuit=True)
+
+    assert (fast["conflict_level"], fast["severity"]) == ("avoid", "high")
+    assert (full["conflict_level"], full["severity"]) == ("avoid", "high")
+    assert "vegan" in full["reason"].lower()
+    assert "vegan" not in fast["reason"].lower()
+
+
+def test_matcher_fast_path_counts_only_checked():
+    """Test fast_path never reports unchecked ingredients as safe."""
+    from orchestrator.agents.matcher import MatcherAgent
+
+    user_profile = {
+        "allergies": [
+            {"name": "Peanut", "severity": "high", "canonical_name": "peanut"}
+        ],
+        "diet_tags": ["vegan"],
+        "sustainability_goals": [],
+        "ingredient_blocklist": [],
+    }
+    ingredient_data = {
+        "Peanut oil": {"tags": ["peanut", "oil", "allergen"]},
+        "Milk": {"tags": ["dairy", "animal-derived"]},
+        "Gelatin": {"tags": ["animal-derived"]},
+    }
+
+    matcher = MatcherAgent()
+    full = matcher.match(ingredient_data, user_profile, "test")
+    fast = matcher.match(ingredient_data, user_profile, "test", fast_path=True)
+
+    assert (full["conflict_count"], full["safe_count"]) == (3, 0)
+    assert not full["partial"]
+    assert fast["partial"]
+    assert fast["requires_review"]
+    assert (fast["conflict_count"], fast["safe_count"]) == (1, 0)
+
+
 def test_ocr_fallback():
     """Test OCR with fallback (when pytesseract not available)."""
     # Create a dummy image bytes
@@ -4,108 +4,387 @@ Database client for Label Detective using Google Firestore.
 
 import os
 import json
+import atexit
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from itertools import count
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
-from utils.logging_utils import get_logger
+from typing import Any, Dict, List, Optional, Tuple
+from cachetools import TTLCache
+from utils.logging_utils import create_trace_id, get_logger
 from google.cloud import firestore
 
 logger = get_logger("database")
 
-# Global database connection
-_db_connection = None
+# Pool of Firestore clients (each with its own gRPC channel), used round-robin
+_db_pool: List[firestore.Client] = []
+_db_round_robin = count()
+
+# Fire-and-forget writes run on _write_pool (doc_ref.set retries transient
+# errors itself), so request threads never wait for Firestore acks; in-flight
+# writes are tracked for flush_pending_writes() and failures are logged
+_write_pool: Optional[ThreadPoolExecutor] = None
+_write_pool_lock = threading.Lock()
+_pending_writes = set()
+
+# How long sessions live before Firestore's TTL policy removes them; read from
+# SESSION_TTL_DAYS in initialize_db
+_SESSION_TTL_DELTA = timedelta(days=30)
+
+# Process-local profile cache for display reads; the writers below invalidate
+# it, but other worker processes only see a change once the TTL expires, so
+# safety checks (allergy matching in /scan) read with fresh=True
+_user_cache = TTLCache(maxsize=1024, ttl=60)
+_user_cache_lock = threading.Lock()
+_MISSING = object()
 
 
 def initialize_db():
-    """Initialize Firestore database connection."""
-    global _db_connection
+    """
+    Initialize Firestore database connection.
+
+    Call in the process that will use the clients (under gunicorn, in
+    post_fork): it opens gRPC channels, which are not fork-safe.
+    """
+    global _db_pool, _write_pool, _SESSION_TTL_DELTA
 
     try:
         project_id = os.getenv("FIRESTORE_PROJECT_ID")
         database_id = os.getenv("FIRESTORE_DATABASE_ID", "firestoredb")
-        _db_connection = firestore.Client(project=project_id, database=database_id)
-        logger.info(f"Initialized Firestore client with database: {database_id}")
+        pool_size = max(1, int(os.getenv("FIRESTORE_CLIENT_POOL_SIZE", "4")))
+        _SESSION_TTL_DELTA = timedelta(days=int(os.getenv("SESSION_TTL_DAYS", "30")))
+        _db_pool = [
+            firestore.Client(project=project_id, database=database_id)
+            for _ in range(pool_size)
+        ]
+        # A write pool whose threads did not survive a fork is dropped
+        _write_pool = None
+        logger.info(
+            f"Initialized {pool_size} Firestore client(s) with database: {database_id}"
+        )
     except Exception as e:
         logger.error(f"Failed to initialize Firestore: {e}")
         raise
 
+    if os.getenv("FIRESTORE_WARMUP", "1") == "1":
+        _warm_up_channels()
+
+
+def _warm_up_channels() -> None:
+    """
+    Open each pooled client's gRPC channel with a cheap listCollectionIds call.
+
+    Channels connect lazily, so without this the first request on each client
+    pays the TLS/HTTP2 handshake. Failures are logged, never raised.
+    """
+    for client in _db_pool:
+        try:
+            next(iter(client.collections(timeout=5)), None)
+        except Exception as e:
+            logger.warning(f"Firestore channel warmup failed: {e}")
+            return
+
+
+def _get_db() -> firestore.Client:
+    """Next client from the pool, spreading concurrent calls across channels."""
+    return _db_pool[next(_db_round_robin) % len(_db_pool)]
+
+
+def _get_write_pool() -> ThreadPoolExecutor:
+    """Lazily create the background write pool (after any fork)."""
+    global _write_pool
+    with _write_pool_lock:
+        if _write_pool is None:
+            max_workers = int(os.getenv("FIRESTORE_WRITE_POOL", "10"))
+            _write_pool = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="firestore-write"
+            )
+        return _write_pool
+
+
+def _write_done(path: str, future) -> None:
+    """Stop tracking a background write and log it if it failed."""
+    with _write_pool_lock:
+        _pending_writes.discard(future)
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Background Firestore write to {path} failed: {error}")
+
+
+def _set_document(doc_ref, data: Dict[str, Any], sync: bool) -> None:
+    """Write a document now (sync) or on the background write pool."""
+    if sync:
+        doc_ref.set(data)
+        return
+
+    future = _get_write_pool().submit(doc_ref.set, data)
+    with _write_pool_lock:
+        _pending_writes.add(future)
+    future.add_done_callback(partial(_write_done, doc_ref.path))
+
+
+def flush_pending_writes(timeout: Optional[float] = None) -> bool:
+    """
+    Wait for every background write to finish.
+
+    Args:
+        timeout: Seconds to wait (None waits forever)
+
+    Returns:
+        True if all writes completed within the timeout
+    """
+    with _write_pool_lock:
+        pending = list(_pending_writes)
+    _, not_done = wait(pending, timeout=timeout)
+    if not_done:
+        logger.warning(f"{len(not_done)} Firestore write(s) still in flight")
+    return not not_done
+
+
+# Don't lose in-flight writes on interpreter shutdown (best effort; gunicorn
+# workers wait in worker_exit, before shutdown begins)
+atexit.register(flush_pending_writes, 10)
+
+
+def get_user(user_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve user profile from Firestore, cached for a minute per process.
 
-def get_user(user_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieve user profile from Firestore."""
-    doc_ref = _db_connection.collection("users").document(user_id)
+    fresh=True always reads Firestore (and refreshes the cache). Callers get
+    their own copy and may modify it.
+    """
+    if not fresh:
+        with _user_cache_lock:
+            cached = _user_cache.get(user_id, _MISSING)
+        if cached is not _MISSING:
+            return copy.deepcopy(cached)
+
+    doc_ref = _get_db().collection("users").document(user_id)
     doc = doc_ref.get()
-    return doc.to_dict() if doc.exists else None
+    # Missing profiles (guests) are cached as None too
+    profile = doc.to_dict() if doc.exists else None
+
+    with _user_cache_lock:
+        _user_cache[user_id] = profile
+    return copy.deepcopy(profile)
+
+
+def invalidate_user(user_id: str) -> None:
+    """Drop a cached profile so the next get_user reads Firestore."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def _normalize_profile_terms(profile_data: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Lowercased allergy and blocklist terms, stored with the profile so
+    matching doesn't redo it every scan (see tools.preprocess_profile).
+    Only the fields present are included, so merge writes keep the rest.
+    """
+    normalized = {}
+    if "allergies" in profile_data:
+        normalized["allergens"] = [
+            allergy.get("canonical_name", allergy.get("name", "")).lower()
+            for allergy in profile_data["allergies"]
+        ]
+    if "ingredient_blocklist" in profile_data:
+        normalized["blocklist"] = [
+            blocked.lower() for blocked in profile_data["ingredient_blocklist"]
+        ]
+    return normalized
 
 
 def save_user(user_id: str, profile_data: Dict[str, Any]) -> None:
     """Save or update user profile."""
+    normalized = _normalize_profile_terms(profile_data)
+    if normalized:
+        profile_data["_normalized"] = normalized
     profile_data["last_active_at"] = datetime.utcnow().isoformat()
-    doc_ref = _db_connection.collection("users").document(user_id)
+    doc_ref = _get_db().collection("users").document(user_id)
     doc_ref.set(profile_data, merge=True)
+    invalidate_user(user_id)
     logger.info(f"Saved user profile for {user_id}")
 
 
-def save_session(session_data: Dict[str, Any]) -> None:
-    """Save session trace with automatic TTL management."""
-    session_id = session_data["session_id"]
-    ttl_days = int(os.getenv("SESSION_TTL_DAYS", "30"))
-    ttl_date = (datetime.utcnow() + timedelta(days=ttl_days)).isoformat()
+def add_to_blocklist(user_id: str, ingredient: str) -> None:
+    """Atomically append an ingredient to the user's blocklist."""
+    doc_ref = _get_db().collection("users").document(user_id)
+    # merge=True so guests without a saved profile still get the entry
+    doc_ref.set(
+        {
+            "ingredient_blocklist": firestore.ArrayUnion([ingredient]),
+            "_normalized": {"blocklist": firestore.ArrayUnion([ingredient.lower()])},
+            "last_active_at": datetime.utcnow().isoformat(),
+        },
+        merge=True,
+    )
+    invalidate_user(user_id)
+    logger.info(f"Added {ingredient} to blocklist for {user_id}")
+
 
-    session_data["ttl_date"] = ttl_date
-    doc_ref = _db_connection.collection("sessions").document(session_id)
-    doc_ref.set(session_data)
+def _stamp_session_ttl(session_data: Dict[str, Any]) -> None:
+    """Set the ttl_date Firestore's TTL policy uses to expire a session."""
+    session_data["ttl_date"] = (datetime.utcnow() + _SESSION_TTL_DELTA).isoformat()
+
+
+def save_session(session_data: Dict[str, Any], sync: bool = False) -> None:
+    """
+    Save session trace with automatic TTL management.
+
+    Written in the background unless sync=True; see flush_pending_writes().
+    """
+    session_id = session_data["session_id"]
+    _stamp_session_ttl(session_data)
+    doc_ref = _get_db().collection("sessions").document(session_id)
+    _set_document(doc_ref, session_data, sync)
     logger.info(f"Saved session {session_id}")
 
 
 def get_session(session_id: str) -> Optional[Dict[str, Any]]:
     """Retrieve session by ID."""
-    doc_ref = _db_connection.collection("sessions").document(session_id)
+    doc_ref = _get_db().collection("sessions").document(session_id)
     doc = doc_ref.get()
     return doc.to_dict() if doc.exists else None
 
 
-def save_scan_history(user_id: str, scan_summary: Dict[str, Any]) -> str:
-    """Save scan to user's history."""
-    from utils.logging_utils import create_trace_id
+def save_scan_history(
+    user_id: str, scan_summary: Dict[str, Any], sync: bool = False
+) -> str:
+    """
+    Save scan to user's history.
 
+    Written in the background unless sync=True; see flush_pending_writes().
+    """
     scan_id = create_trace_id()
+    # History is ordered on timestamp, so every entry needs one
+    if not isinstance(scan_summary.get("timestamp"), str):
+        scan_summary["timestamp"] = datetime.utcnow().isoformat()
 
     doc_ref = (
-        _db_connection.collection("history")
+        _get_db().collection("history")
         .document(user_id)
         .collection("scans")
         .document(scan_id)
     )
-    doc_ref.set(scan_summary)
+    _set_document(doc_ref, scan_summary, sync)
     logger.info(f"Saved scan history for user {user_id}")
     return scan_id
 
 
-def get_scan_history(
-    user_id: str, filters: Optional[Dict[str, Any]] = None
-) -> List[Dict[str, Any]]:
+# History pages are ordered newest first on the ISO "timestamp" every entry
+# carries; Firestore leaves documents without it out of ordered queries, so
+# older entries need backfill_history_timestamps() once. Filtering by verdict
+# while ordering needs a composite index on the "scans" collection group:
+#   verdict ASC, timestamp DESC   (gcloud command in the README)
+HISTORY_PAGE_SIZE = 50
+_MAX_HISTORY_PAGE_SIZE = 200
+
+
+def _is_valid_doc_id(doc_id: str) -> bool:
+    """Whether doc_id can name a Firestore document (no path separators etc.)."""
+    return (
+        0 < len(doc_id.encode()) <= 1500
+        and "/" not in doc_id
+        and doc_id not in (".", "..")
+        and not (doc_id.startswith("__") and doc_id.endswith("__"))
+    )
+
+
+def backfill_history_timestamps() -> int:
     """
-    Retrieve user's scan history with optional filters.
+    Stamp history entries saved without a "timestamp" so /history lists them.
 
-    Args:
-        user_id: User identifier
-        filters: Optional filters (verdict, date_from, date_to)
+    The document's create_time stands in for the missing value. Safe to
+    re-run; entries that already have a timestamp are left alone.
 
     Returns:
-        List of scan summaries
+        Number of entries updated
     """
-    query = _db_connection.collection("history").document(user_id).collection("scans")
+    client = _get_db()
+    batch = client.batch()
+    pending = updated = 0
+
+    for snapshot in client.collection_group("scans").select(["timestamp"]).stream():
+        if isinstance((snapshot.to_dict() or {}).get("timestamp"), str):
+            continue
+        batch.update(
+            snapshot.reference, {"timestamp": snapshot.create_time.isoformat()}
+        )
+        pending += 1
+        updated += 1
+        # Firestore caps a batch at 500 writes
+        if pending == 500:
+            batch.commit()
+            batch = client.batch()
+            pending = 0
+
+    if pending:
+        batch.commit()
+    logger.info(f"Backfilled timestamp on {updated} history entries")
+    return updated
 
-    if filters:
-        if "verdict" in filters:
-            query = query.where("verdict", "==", filters["verdict"])
 
-    docs = query.stream()
-    return [doc.to_dict() for doc in docs]
+def get_scan_history(
+    user_id: str,
+    filters: Optional[Dict[str, Any]] = None,
+    page_token: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Retrieve one page of the user's scan history, newest first.
 
+    Args:
+        user_id: User identifier
+        filters: Optional filters (verdict, date_from, date_to as ISO strings,
+            limit)
+        page_token: next_page_token from the previous page
+        fields: Only fetch these fields (default: whole documents)
 
-def create_pending_review(user_id: str, session_id: str, reason: str) -> str:
+    Returns:
+        Tuple of (scan summaries, next_page_token or None on the last page)
+
+    Raises:
+        ValueError: If page_token is not a scan in this user's history
     """
-    Create a pending review for human-in-the-loop confirmation.
+    filters = filters or {}
+    try:
+        limit = int(filters.get("limit", HISTORY_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = HISTORY_PAGE_SIZE
+    limit = min(max(limit, 1), _MAX_HISTORY_PAGE_SIZE)
+    scans = _get_db().collection("history").document(user_id).collection("scans")
+
+    query = scans
+    if "verdict" in filters:
+        query = query.where("verdict", "==", filters["verdict"])
+    if "date_from" in filters:
+        query = query.where("timestamp", ">=", filters["date_from"])
+    if "date_to" in filters:
+        query = query.where("timestamp", "<=", filters["date_to"])
+    query = query.order_by("timestamp", direction=firestore.Query.DESCENDING)
+    if fields:
+        query = query.select(fields)
+
+    if page_token is not None:
+        # The token is the last scan_id of the previous page; resume after it
+        if not _is_valid_doc_id(page_token):
+            raise ValueError("Invalid page token")
+        last_doc = scans.document(page_token).get()
+        if not last_doc.exists:
+            raise ValueError("Invalid page token")
+        query = query.start_after(last_doc)
+
+    # One extra document tells us whether another page exists
+    docs = list(query.limit(limit + 1).stream())
+    next_page_token = docs[limit - 1].id if len(docs) > limit else None
+    return [doc.to_dict() for doc in docs[:limit]], next_page_token
+
+
+def build_pending_review(user_id: str, session_id: str, reason: str) -> Dict[str, Any]:
+    """
+    Build a pending review document (with a fresh review_id) without writing it.
 
     Args:
         user_id: User identifier
@@ -113,14 +392,10 @@ def create_pending_review(user_id: str, session_id: str, reason: str) -> str:
         reason: Reason for requiring review
 
     Returns:
-        review_id
+        Review document, ready for create_pending_review or commit_scan_atomic
     """
-    from utils.logging_utils import create_trace_id
-
-    review_id = create_trace_id()
-
-    review_data = {
-        "review_id": review_id,
+    return {
+        "review_id": create_trace_id(),
         "session_id": session_id,
         "user_id": user_id,
         "status": "pending",
@@ -130,15 +405,74 @@ def create_pending_review(user_id: str, session_id: str, reason: str) -> str:
         "created_at": datetime.utcnow().isoformat(),
     }
 
-    doc_ref = _db_connection.collection("reviews").document(review_id)
+
+def create_pending_review(user_id: str, session_id: str, reason: str) -> str:
+    """
+    Create a pending review for human-in-the-loop confirmation.
+
+    Args:
+        user_id: User identifier
+        session_id: Session requiring review
+        reason: Reason for requiring review
+
+    Returns:
+        review_id
+    """
+    review_data = build_pending_review(user_id, session_id, reason)
+    review_id = review_data["review_id"]
+
+    doc_ref = _get_db().collection("reviews").document(review_id)
     doc_ref.set(review_data)
     logger.info(f"Created pending review {review_id}")
     return review_id
 
 
+def commit_scan_atomic(
+    session_data: Dict[str, Any],
+    history_entry: Optional[Dict[str, Any]] = None,
+    review: Optional[Dict[str, Any]] = None,
+) -> Optional[str]:
+    """
+    Persist a finished scan in a single batched commit.
+
+    Args:
+        session_data: Session trace (TTL is stamped as in save_session)
+        history_entry: Optional summary for the user's scan history
+        review: Optional pending review from build_pending_review
+
+    Returns:
+        History scan_id if a history entry was written, else None
+    """
+    session_id = session_data["session_id"]
+    _stamp_session_ttl(session_data)
+
+    client = _get_db()
+    batch = client.batch()
+    batch.set(client.collection("sessions").document(session_id), session_data)
+
+    scan_id = None
+    if history_entry is not None:
+        scan_id = create_trace_id()
+        history_entry.setdefault("timestamp", datetime.utcnow().isoformat())
+        history_ref = (
+            client.collection("history")
+            .document(session_data["user_id"])
+            .collection("scans")
+            .document(scan_id)
+        )
+        batch.set(history_ref, history_entry)
+
+    if review is not None:
+        batch.create(client.collection("reviews").document(review["review_id"]), review)
+
+    batch.commit()
+    logger.info(f"Committed scan session {session_id}")
+    return scan_id
+
+
 def get_pending_reviews(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
     """Get pending reviews, optionally filtered by user."""
-    query = _db_connection.collection("reviews").where("status", "==", "pending")
+    query = _get_db().collection("reviews").where("status", "==", "pending")
     if user_id:
         query = query.where("user_id", "==", user_id)
     docs = query.stream()
@@ -147,37 +481,38 @@ def get_pending_reviews(user_id: Optional[str] = None) -> List[Dict[str, Any]]:
 
 def update_review_status(review_id: str, status: str, notes: str = "") -> None:
     """Update review status."""
-    doc_ref = _db_connection.collection("reviews").document(review_id)
+    doc_ref = _get_db().collection("reviews").document(review_id)
     doc_ref.update({"status": status, "notes": notes})
     logger.info(f"Updated review {review_id} to status {status}")
 
 
-def save_memory(user_id: str, fact: Dict[str, Any]) -> None:
+def save_memory(user_id: str, fact: Dict[str, Any], sync: bool = False) -> None:
     """
     Store long-term memory fact for persistent storage.
 
     Args:
         user_id: User identifier
         fact: Memory fact dictionary
+        sync: Write before returning instead of in the background
     """
-    from utils.logging_utils import create_trace_id
-
     fact_id = create_trace_id()
     fact["fact_id"] = fact_id
     fact["created_at"] = datetime.utcnow().isoformat()
 
     doc_ref = (
-        _db_connection.collection("memories")
+        _get_db().collection("memories")
         .document(user_id)
         .collection("facts")
         .document(fact_id)
     )
-    doc_ref.set(fact)
+    _set_document(doc_ref, fact, sync)
     logger.info(f"Saved memory fact for user {user_id}")
 
 
 def fetch_memories(
-    user_id: str, filters: Optional[Dict[str, Any]] = None
+    user_id: str,
+    filters: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Query long-term memory facts.
@@ -185,17 +520,20 @@ def fetch_memories(
     Args:
         user_id: User identifier
         filters: Optional filters (type, subject)
+        fields: Only fetch these fields (default: whole documents)
 
     Returns:
         List of memory facts
     """
-    query = _db_connection.collection("memories").document(user_id).collection("facts")
+    query = _get_db().collection("memories").document(user_id).collection("facts")
 
     if filters:
         if "type" in filters:
             query = query.where("type", "==", filters["type"])
         if "subject" in filters:
             query = query.where("subject", "==", filters["subject"])
+    if fields:
+        query = query.select(fields)
 
     docs = query.stream()
     return [doc.to_dict() for doc in docs]
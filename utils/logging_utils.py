@@ -5,37 +5,102 @@ Provides structured JSON logging with trace IDs and span tracking.
 
 import logging
 import json
-import uuid
+import os
+import reprlib
 import time
-from datetime import datetime
 from typing import Any, Dict, Optional
 
+try:
+    import orjson  # optional: faster JSON serialization
+except ImportError:
+    orjson = None
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    """Serialize a log line, preferring orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data)
+
+
+# Optional record attributes copied into the JSON line, in output order
+_EXTRA_FIELDS = ("trace_id", "session_id", "user_id", "agent", "tool", "duration_ms")
+
+_MISSING = object()
+
+# (epoch millisecond, formatted timestamp) of the last formatted record; records
+# logged within the same millisecond reuse the string. Swapped as one tuple so
+# concurrent handlers never see a mismatched pair.
+_ts_cache = (0, "")
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") so strftime runs once per second
+_second_cache = (-1, "")
+
+
+def _format_iso_ms(epoch_ms: int) -> str:
+    """Format epoch milliseconds as an ISO 8601 UTC timestamp."""
+    global _second_cache
+    seconds, millis = divmod(epoch_ms, 1000)
+    cached = _second_cache
+    if cached[0] != seconds:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+        cached = _second_cache = (seconds, prefix)
+    return f"{cached[1]}.{millis:03d}Z"
+
+
+def _timestamp(created: float) -> str:
+    """Cached ISO timestamp for a record's creation time."""
+    global _ts_cache
+    epoch_ms = int(created * 1000)
+    cached = _ts_cache
+    if cached[0] != epoch_ms:
+        cached = _ts_cache = (epoch_ms, _format_iso_ms(epoch_ms))
+    return cached[1]
+
+
+# Monotonic, nanosecond-resolution clock for span durations
+_perf_counter_ns = time.perf_counter_ns
+
+# Bounded repr for span summaries; never materializes the full string
+_summary_repr = reprlib.Repr()
+_summary_repr.maxstring = 200
+_summary_repr.maxother = 200
+_summary_repr.maxdict = 4
+_summary_repr.maxlist = 4
+
+
+def _summarize(data: Any) -> str:
+    """Short, size-bounded description of span input or output."""
+    if not data:
+        return ""
+    if isinstance(data, (bytes, bytearray)):
+        return f"<{len(data)} bytes>"
+    return _summary_repr.repr(data)
+
 
 class JSONFormatter(logging.Formatter):
     """Custom formatter that outputs logs as JSON."""
 
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
-            "time": datetime.utcnow().isoformat() + "Z",
+            "time": _timestamp(record.created),
             "level": record.levelname,
             "message": record.getMessage(),
         }
 
-        # Add custom fields if present
-        if hasattr(record, "trace_id"):
-            log_data["trace_id"] = record.trace_id
-        if hasattr(record, "session_id"):
-            log_data["session_id"] = record.session_id
-        if hasattr(record, "user_id"):
-            log_data["user_id"] = record.user_id
-        if hasattr(record, "agent"):
-            log_data["agent"] = record.agent
-        if hasattr(record, "tool"):
-            log_data["tool"] = record.tool
-        if hasattr(record, "duration_ms"):
-            log_data["duration_ms"] = record.duration_ms
+        # Span logs carry their fields pre-assembled in one attribute
+        record_dict = record.__dict__
+        span_extra = record_dict.get("span_extra")
+        if span_extra is not None:
+            log_data.update(span_extra)
+        else:
+            # Add custom fields if present
+            for field in _EXTRA_FIELDS:
+                value = record_dict.get(field, _MISSING)
+                if value is not _MISSING:
+                    log_data[field] = value
 
-        return json.dumps(log_data)
+        return _dumps(log_data)
 
 
 def setup_logger(name: str = "label_detective", level: str = "INFO") -> logging.Logger:
@@ -55,8 +120,28 @@ def setup_logger(name: str = "label_detective", level: str = "INFO") -> logging.
 
 
 def create_trace_id() -> str:
-    """Generate a unique trace ID for request tracing."""
-    return str(uuid.uuid4())
+    """Generate a unique trace ID (128 random bits as 32 hex chars)."""
+    return os.urandom(16).hex()
+
+
+def _span_extra(
+    trace_id: str,
+    agent_name: str,
+    tool_name: str,
+    duration_ms: float,
+    session_id: Optional[str],
+    user_id: Optional[str],
+) -> Dict[str, Any]:
+    """Span fields for the formatter, in _EXTRA_FIELDS order."""
+    span_extra = {"trace_id": trace_id}
+    if session_id:
+        span_extra["session_id"] = session_id
+    if user_id:
+        span_extra["user_id"] = user_id
+    span_extra["agent"] = agent_name
+    span_extra["tool"] = tool_name
+    span_extra["duration_ms"] = duration_ms
+    return span_extra
 
 
 def log_span(
@@ -71,25 +156,27 @@ def log_span(
     user_id: Optional[str] = None,
 ) -> None:
     """Log a span event for a tool call with timing and context information."""
-    # Truncate large inputs/outputs for logging
-    input_summary = str(input_data)[:200] if input_data else ""
-    output_summary = str(output_data)[:200] if output_data else ""
+    # Skip formatting entirely when INFO is filtered out
+    if not logger.isEnabledFor(logging.INFO):
+        return
 
-    extra = {
-        "trace_id": trace_id,
-        "agent": agent_name,
-        "tool": tool_name,
-        "duration_ms": duration_ms,
-    }
+    span_extra = _span_extra(
+        trace_id, agent_name, tool_name, duration_ms, session_id, user_id
+    )
 
-    if session_id:
-        extra["session_id"] = session_id
-    if user_id:
-        extra["user_id"] = user_id
+    # Tool inputs and outputs can hold user text and profile data, so bounded
+    # summaries of them are only logged when debugging
+    if logger.isEnabledFor(logging.DEBUG):
+        input_summary = _summarize(input_data)
+        if input_summary:
+            span_extra["input_summary"] = input_summary
+        output_summary = _summarize(output_data)
+        if output_summary:
+            span_extra["output_summary"] = output_summary
 
     logger.info(
         f"Tool call: {agent_name}.{tool_name} completed in {duration_ms:.2f}ms",
-        extra=extra,
+        extra={"span_extra": span_extra},
     )
 
 
@@ -116,18 +203,20 @@ class SpanTimer:
         self.tool_name = tool_name
         self.session_id = session_id
         self.user_id = user_id
-        self.start_time = None
+        self.start_ns = None
         self.input_data = None
         self.output_data = None
 
     def __enter__(self):
-        self.start_time = time.time()
+        self.start_ns = _perf_counter_ns()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        duration_ms = (time.time() - self.start_time) * 1000
+        duration_ms = (_perf_counter_ns() - self.start_ns) / 1_000_000
 
         if exc_type is None:
+            if not self.logger.isEnabledFor(logging.INFO):
+                return
             log_span(
                 self.logger,
                 self.trace_id,
@@ -139,22 +228,19 @@ class SpanTimer:
                 self.session_id,
                 self.user_id,
             )
-        else:
+        elif self.logger.isEnabledFor(logging.ERROR):
             # Log error span
-            extra = {
-                "trace_id": self.trace_id,
-                "agent": self.agent_name,
-                "tool": self.tool_name,
-                "duration_ms": duration_ms,
-                "error": str(exc_val),
-            }
-            if self.session_id:
-                extra["session_id"] = self.session_id
-            if self.user_id:
-                extra["user_id"] = self.user_id
-
+            span_extra = _span_extra(
+                self.trace_id,
+                self.agent_name,
+                self.tool_name,
+                duration_ms,
+                self.session_id,
+                self.user_id,
+            )
             self.logger.error(
-                f"Tool call failed: {self.agent_name}.{tool_name}", extra=extra
+                f"Tool call failed: {self.agent_name}.{self.tool_name}",
+                extra={"span_extra": span_extra, "error": str(exc_val)},
             )
 
     def set_input(self, data: Any):